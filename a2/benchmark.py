@@ -0,0 +1,297 @@
+"""
+A benchmark of our game engines, to check that a change to them does not
+make them slower.
+
+Every benchmark times one operation on fixed positions: the operations per
+second of the best of several runs, and the peak memory of one operation
+traced by tracemalloc, are compared against a saved baseline. Speeds
+depend on the machine, so no baseline is shipped: save one with --save
+before making a change.
+
+Run it from the command line, e.g. to save a baseline and later compare
+against it:
+
+    python benchmark.py --save
+    python benchmark.py
+
+NOTE: You do not have to run python-ta on this file.
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+import strategy
+from stonehenge_game import StonehengeGame
+from stonehenge_state import StonehengeState
+from subtract_square_game import SubtractSquareGame
+from subtract_square_state import SubtractSquareState
+
+# the baseline compared against unless another is given
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'benchmark_baseline.json')
+
+# the fraction of its baseline speed a benchmark may lose before it is
+# reported as slower
+TOLERANCE = 0.1
+
+# the fraction of its baseline peak memory a benchmark may gain before it is
+# reported as larger, and the KiB it may always gain, below which tracemalloc
+# measures noise
+MEMORY_TOLERANCE = 0.1
+MEMORY_SLACK_KIB = 1.0
+
+
+# helper function to reach the same midgame position every time
+def _stonehenge_midgame(length: int, moves: int) -> StonehengeState:
+    """
+    Return the state of side length length reached by claiming the first
+    free cell, then the last, and so on, moves times.
+
+    >>> _stonehenge_midgame(2, 2).get_possible_moves()
+    ['B', 'C', 'D', 'E', 'F']
+    """
+    state = StonehengeState(True, length)
+    for i in range(moves):
+        free = state.get_possible_moves()
+        state = state.make_move(free[-1] if i % 2 else free[0])
+    return state
+
+
+def _solve(game_class: type, strategy_: Callable[[Any], Any],
+           *args: Any) -> Callable[[], Any]:
+    """
+    Return an operation choosing a move with strategy_ for a new
+    game_class(True, *args), starting from an empty transposition table.
+    """
+    def operation() -> Any:
+        """
+        Choose the first move of a new game.
+        """
+        strategy.transposition_table.clear()
+        return strategy_(game_class(True, *args))
+    return operation
+
+
+def _cycle(state: Any, method: str) -> Callable[[], Any]:
+    """
+    Return an operation calling method of state with each of its moves in
+    turn.
+    """
+    moves = state.get_possible_moves()
+    call = getattr(state, method)
+    position = [0]
+
+    def operation() -> Any:
+        """
+        Call method with the next move.
+        """
+        position[0] = (position[0] + 1) % len(moves)
+        return call(moves[position[0]])
+    return operation
+
+
+def benchmarks() -> Dict[str, Callable[[], Any]]:
+    """
+    Return the operations benchmarked, by name.
+    """
+    midgame = _stonehenge_midgame(5, 6)
+    return {
+        'stonehenge.make_move[5]': _cycle(midgame, 'make_move'),
+        'stonehenge.get_possible_moves[5]': midgame.get_possible_moves,
+        'stonehenge.rough_outcome[5]': midgame.rough_outcome,
+        'stonehenge.minimax_recursive[2]':
+            _solve(StonehengeGame, strategy.minimax_recursive_strategy, 2),
+        'stonehenge.minimax_recursive[3]':
+            _solve(StonehengeGame, strategy.minimax_recursive_strategy, 3),
+        'stonehenge.minimax_iterative[3]':
+            _solve(StonehengeGame, strategy.minimax_iterative_strategy, 3),
+        'stonehenge.alpha_beta[3]':
+            _solve(StonehengeGame, strategy.alpha_beta_strategy, 3),
+        'subtract_square.get_possible_moves[1000]':
+            SubtractSquareState(True, 1000).get_possible_moves,
+        'subtract_square.rough_outcome[1000]':
+            SubtractSquareState(True, 1000).rough_outcome,
+        'subtract_square.minimax_recursive[40]':
+            _solve(SubtractSquareGame, strategy.minimax_recursive_strategy,
+                   40),
+        'subtract_square.minimax_iterative[40]':
+            _solve(SubtractSquareGame, strategy.minimax_iterative_strategy,
+                   40),
+    }
+
+
+def measure(operation: Callable[[], Any], min_time: float = 0.2,
+            repeat: int = 3) -> Dict[str, float]:
+    """
+    Return the operations per second of operation, the best of repeat runs
+    each lasting at least min_time seconds, and the peak memory in KiB
+    traced while it runs once.
+
+    >>> result = measure(lambda: sum(range(100)), 0.01, 1)
+    >>> sorted(result), result['ops_per_sec'] > 0
+    (['ops_per_sec', 'peak_kib'], True)
+    """
+    # find how many calls last at least min_time
+    count = 1
+    while True:
+        elapsed = _time_calls(operation, count)
+        if elapsed >= min_time:
+            break
+        count *= 2 if elapsed <= 0 else max(2, int(min_time / elapsed) + 1)
+    best = elapsed
+    for _ in range(repeat - 1):
+        best = min(best, _time_calls(operation, count))
+
+    tracemalloc.start()
+    try:
+        operation()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'ops_per_sec': count / best, 'peak_kib': peak / 1024}
+
+
+def _time_calls(operation: Callable[[], Any], count: int) -> float:
+    """
+    Return the seconds taken to call operation count times, with garbage
+    collection paused.
+    """
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for _ in range(count):
+            operation()
+        return time.perf_counter() - start
+    finally:
+        gc.enable()
+
+
+def run_benchmarks(names: List[str] = None, min_time: float = 0.2,
+                   repeat: int = 3) -> Dict[str, Dict[str, float]]:
+    """
+    Return the measure of every benchmark, or of those named in names.
+    """
+    operations = benchmarks()
+    return {name: measure(operations[name], min_time, repeat)
+            for name in (names or operations)}
+
+
+def compare(results: Dict[str, Dict[str, float]],
+            baseline: Dict[str, Dict[str, float]],
+            tolerance: float = TOLERANCE,
+            memory_tolerance: float = MEMORY_TOLERANCE
+            ) -> List[Tuple[str, str, float]]:
+    """
+    Return the benchmarks of results more than tolerance slower than in
+    baseline, or using more than memory_tolerance (and MEMORY_SLACK_KIB)
+    more peak memory, with the measure that got worse and its ratio to the
+    baseline's.
+
+    >>> compare({'a': {'ops_per_sec': 80.0, 'peak_kib': 10.0},
+    ...          'b': {'ops_per_sec': 95.0, 'peak_kib': 20.0}},
+    ...         {'a': {'ops_per_sec': 100.0, 'peak_kib': 10.0},
+    ...          'b': {'ops_per_sec': 100.0, 'peak_kib': 10.0}})
+    [('a', 'ops_per_sec', 0.8), ('b', 'peak_kib', 2.0)]
+    """
+    worse = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        base = baseline[name]
+        if result['ops_per_sec'] < (1 - tolerance) * base['ops_per_sec']:
+            worse.append((name, 'ops_per_sec',
+                          result['ops_per_sec'] / base['ops_per_sec']))
+        if 'peak_kib' in base and result['peak_kib'] > (
+                (1 + memory_tolerance) * base['peak_kib']
+                + MEMORY_SLACK_KIB):
+            worse.append((name, 'peak_kib',
+                          result['peak_kib'] / max(base['peak_kib'], 1e-9)))
+    return worse
+
+
+def _format_results(results: Dict[str, Dict[str, float]],
+                    baseline: Dict[str, Dict[str, float]]) -> str:
+    """
+    Return results as a table to print, with the speed of each benchmark
+    relative to baseline where it has one.
+    """
+    lines = ['{:<42} {:>14} {:>10} {:>9}'.format(
+        'benchmark', 'ops/sec', 'peak KiB', 'vs base')]
+    for name, result in results.items():
+        ratio = ''
+        if name in baseline:
+            ratio = '{:.2f}x'.format(result['ops_per_sec']
+                                     / baseline[name]['ops_per_sec'])
+        lines.append('{:<42} {:>14.1f} {:>10.1f} {:>9}'.format(
+            name, result['ops_per_sec'], result['peak_kib'], ratio))
+    return '\n'.join(lines)
+
+
+def main(args: List[str] = None) -> int:
+    """
+    Run the benchmarks described by the command line arguments args, and
+    return 1 if any is slower or uses more memory than its baseline, or 0.
+    """
+    parser = argparse.ArgumentParser(
+        description='Benchmark the game engines against a baseline.')
+    parser.add_argument('names', nargs='*',
+                        help='benchmarks to run, all of them by default')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                        help='the JSON file of the baseline')
+    parser.add_argument('--save', action='store_true',
+                        help='save the results as the baseline')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help='fraction of speed that may be lost')
+    parser.add_argument('--memory-tolerance', type=float,
+                        default=MEMORY_TOLERANCE,
+                        help='fraction of peak memory that may be gained')
+    parser.add_argument('--min-time', type=float, default=0.2,
+                        help='seconds every timed run lasts at least')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='timed runs of each benchmark')
+    parser.add_argument('--list', action='store_true',
+                        help='list the benchmarks and exit')
+    options = parser.parse_args(args)
+    if options.list:
+        print('\n'.join(benchmarks()))
+        return 0
+    unknown = set(options.names) - set(benchmarks())
+    if unknown:
+        parser.error('unknown benchmarks: {}'.format(', '.join(
+            sorted(unknown))))
+
+    results = run_benchmarks(options.names, options.min_time, options.repeat)
+    baseline = {}
+    if os.path.exists(options.baseline):
+        with open(options.baseline) as file:
+            baseline = json.load(file)
+    print(_format_results(results, baseline))
+
+    if options.save:
+        with open(options.baseline, 'w') as file:
+            json.dump(dict(baseline, **results), file, indent=2,
+                      sort_keys=True)
+        print('saved baseline to {}'.format(options.baseline))
+        return 0
+    if not baseline:
+        print('no baseline at {}; save one with --save'.format(
+            options.baseline))
+    worse = compare(results, baseline, options.tolerance,
+                    options.memory_tolerance)
+    for name, metric, ratio in worse:
+        if metric == 'ops_per_sec':
+            print('SLOWER: {} runs at {:.0%} of its baseline'.format(
+                name, ratio))
+        else:
+            print('LARGER: {} uses {:.0%} of its baseline peak memory'
+                  .format(name, ratio))
+    return 1 if worse else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
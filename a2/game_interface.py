@@ -13,7 +13,13 @@ from strategy import interactive_strategy
 from strategy import rough_outcome_strategy
 from strategy import minimax_recursive_strategy
 from strategy import minimax_iterative_strategy
-from typing import Any, Callable
+from strategy import alpha_beta_strategy
+from strategy import parallel_minimax_strategy
+from strategy import iterative_deepening_strategy
+from strategy import mcts_strategy
+from subtract_square_solver import table_strategy
+from stonehenge_book import book_strategy
+from typing import Any, Callable, Optional
 from subtract_square_game import SubtractSquareGame
 from stonehenge_game import StonehengeGame
 
@@ -28,7 +34,13 @@ playable_games = {'s': SubtractSquareGame,
 usable_strategies = {'i': interactive_strategy,
                      'ro': rough_outcome_strategy,
                      'mr': minimax_recursive_strategy,
-                     'mi': minimax_iterative_strategy}
+                     'mi': minimax_iterative_strategy,
+                     'ab': alpha_beta_strategy,
+                     't': table_strategy,
+                     'pm': parallel_minimax_strategy,
+                     'id': iterative_deepening_strategy,
+                     'bk': book_strategy,
+                     'mc': mcts_strategy}
 
 
 class GameInterface:
@@ -38,7 +50,8 @@ class GameInterface:
     """
 
     def __init__(self, game: Any, p1_strategy: Callable,
-                 p2_strategy: Callable[[Any], Any]) -> None:
+                 p2_strategy: Callable[[Any], Any], p1_starts: bool = None,
+                 verbose: bool = True, **game_options: Any) -> None:
         """
         Initialize this GameInterface, setting its active game to game, and
         using the strategies p1_strategy for Player 1 and p2_strategy for
@@ -50,24 +63,34 @@ class GameInterface:
         :type p1_strategy:
         :param p2_strategy: The strategy for Play 2.
         :type p2_strategy:
+        :param p1_starts: Whether Player 1 makes the first move; asked for
+                          if not given.
+        :type p1_starts: bool
+        :param verbose: Whether to print the game as it is played.
+        :type verbose: bool
+        :param game_options: The options to construct game with, such as the
+                             side length of a Stonehenge board; asked for
+                             by the game if not given.
         """
-        first_player = input("Type y if player 1 is to make the first move: ")
-        is_p1_turn = False
-        if first_player.lower() == 'y':
-            is_p1_turn = True
+        if p1_starts is None:
+            first_player = input(
+                "Type y if player 1 is to make the first move: ")
+            p1_starts = first_player.lower() == 'y'
 
-        self.game = game(is_p1_turn)
+        self.game = game(p1_starts, **game_options)
         self.p1_strategy = p1_strategy
         self.p2_strategy = p2_strategy
+        self.verbose = verbose
 
-    def play(self) -> None:
+    def play(self) -> Optional[str]:
         """
-        Play the game.
+        Play the game, and return the name of the winner, or None for a tie.
         """
         current_state = self.game.current_state
+        show = print if self.verbose else _ignore
 
-        print(self.game.get_instructions())
-        print(current_state)
+        show(self.game.get_instructions())
+        show(current_state)
 
         # Pick moves until the game is over
         while not self.game.is_over(current_state):
@@ -75,9 +98,9 @@ class GameInterface:
 
             # Print out all of the valid moves
             possible_moves = current_state.get_possible_moves()
-            print("The current available moves are:")
+            show("The current available moves are:")
             for move in possible_moves:
-                print(move)
+                show(move)
 
             # Pick a (legal) move.
             while not current_state.is_valid_move(move_to_make):
@@ -92,17 +115,25 @@ class GameInterface:
             self.game.current_state = new_game_state
             current_state = self.game.current_state
 
-            print("{} made the move {}. The game's state is now:".format(
+            show("{} made the move {}. The game's state is now:".format(
                 current_player_name, move_to_make))
-            print(current_state)
+            show(current_state)
 
         # Print out the winner of the game
         if self.game.is_winner("p1"):
-            print("Player 1 is the winner!")
+            show("Player 1 is the winner!")
+            return 'p1'
         elif self.game.is_winner("p2"):
-            print("Player 2 is the winner!")
-        else:
-            print("It's a tie!")
+            show("Player 2 is the winner!")
+            return 'p2'
+        show("It's a tie!")
+        return None
+
+
+def _ignore(*args: Any) -> None:
+    """
+    Print nothing, in place of print when a game is played quietly.
+    """
 
 
 if __name__ == '__main__':
@@ -18,6 +18,7 @@ class GameState:
     WIN: int = 1
     LOSE: int = -1
     DRAW: int = 0
+    __slots__ = ('p1_turn',)
     p1_turn: bool
 
     def __init__(self, is_p1_turn: bool) -> None:
@@ -55,6 +56,19 @@ class GameState:
         """
         raise NotImplementedError
 
+    def apply(self, move: Any) -> None:
+        """
+        Apply move to this GameState in place, remembering it so that undo
+        can take it back.
+        """
+        raise NotImplementedError
+
+    def undo(self) -> None:
+        """
+        Take back the last move applied to this GameState and not yet undone.
+        """
+        raise NotImplementedError
+
     def is_valid_move(self, move: Any) -> bool:
         """
         Return whether move is a valid move for this GameState.
@@ -68,6 +82,21 @@ class GameState:
         """
         raise NotImplementedError
 
+    def child_outcomes(self, moves: list) -> Any:
+        """
+        Return the rough_outcome of the GameState that results from applying
+        each of moves to this GameState, for the player about to move there.
+        Subclasses may score them all at once.
+        """
+        return [self.make_move(move).rough_outcome() for move in moves]
+
+    def batches_child_outcomes(self, moves: list) -> bool:
+        """
+        Return whether child_outcomes scores the GameStates after moves
+        without making them.
+        """
+        return False
+
     def rough_outcome(self) -> float:
         """
         Return an estimate in interval [LOSE, WIN] of best outcome the current
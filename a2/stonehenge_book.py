@@ -0,0 +1,269 @@
+"""
+An opening book and endgame tablebase for Stonehenge.
+
+Small gameboards are solved completely, and endgames of larger ones are
+solved from positions reached by random play, offline. Every solved state
+is written to a file of records sorted by the state's Zobrist hash, which
+book_strategy searches through a memory map instead of searching the game.
+
+Build a book from the command line, e.g. for side lengths 1 to 3 and 200
+endgames of side length 4:
+
+    python stonehenge_book.py --lengths 1 2 3 --sample 4 --games 200
+
+NOTE: You do not have to run python-ta on this file.
+"""
+import argparse
+import mmap
+import os
+import random
+import struct
+from typing import Any, Dict, Iterable, Optional, Tuple
+from game import Game
+from stonehenge_state import StonehengeState
+from strategy import alpha_beta_strategy, instrumented
+
+# the first bytes of a saved book
+MAGIC = b'SHBK'
+
+# the book read by book_strategy
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            'stonehenge_book.bin')
+
+# a record: the Zobrist hash of a state, its score for the player about to
+# move, and the cell of its best move
+_RECORD = struct.Struct('<QbH')
+_HEADER = struct.Struct('<4sQ')
+
+
+class OpeningBook:
+    """
+    A book of solved Stonehenge states saved by write_book, read from its
+    file through a memory map opened when it is first needed.
+
+    path - the file the book is read from
+    """
+    path: str
+
+    def __init__(self, path: str) -> None:
+        """
+        Create OpeningBook self reading the book at path.
+        """
+        self.path = path
+        self._file = None
+        self._map = None
+        self._size = 0
+
+    def __len__(self) -> int:
+        """
+        Return the number of states in OpeningBook self.
+        """
+        self._open()
+        return self._size
+
+    def lookup(self, state: StonehengeState) -> Optional[Tuple[int, int]]:
+        """
+        Return the score of state for the player about to move and the cell
+        of its best move, or None if state is not in OpeningBook self.
+        """
+        self._open()
+        key = hash(state)
+        low, high = 0, self._size
+        while low < high:
+            middle = (low + high) // 2
+            found, score, cell = _RECORD.unpack_from(
+                self._map, _HEADER.size + middle * _RECORD.size)
+            if found == key:
+                return score, cell
+            if found < key:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def close(self) -> None:
+        """
+        Close the file of OpeningBook self; it is opened again if needed.
+        """
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+        self._file = None
+        self._map = None
+
+    # helper function to map the book's file into memory
+    def _open(self) -> None:
+        """
+        Map the file of OpeningBook self into memory unless it already is.
+        """
+        if self._map is not None:
+            return
+        self._file = open(self.path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        except ValueError:
+            # an empty file cannot be mapped
+            self._file.close()
+            raise ValueError('{} is not a saved book'.format(self.path))
+        magic, self._size = _HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError('{} is not a saved book'.format(self.path))
+
+
+def solve(state: StonehengeState,
+          solved: Dict[int, Tuple[int, int]]) -> int:
+    """
+    Return the score of state for the player about to move, adding every
+    state reachable from it that is not over to solved, keyed by its hash,
+    with its score and the cell of its first best move.
+
+    >>> solved = {}
+    >>> solve(StonehengeState(True, 1), solved), len(solved)
+    (1, 1)
+    >>> state = StonehengeState(True, 2)
+    >>> solve(state, solved)
+    1
+    >>> solved[hash(state)]
+    (1, 0)
+    """
+    if state.game_over():
+        return state.LOSE
+    key = hash(state)
+    if key in solved:
+        return solved[key][0]
+    best_score = state.LOSE - 1
+    best_cell = None
+    for cell in state.get_possible_cells():
+        score = -solve(state.make_move(cell), solved)
+        if score > best_score:
+            best_score, best_cell = score, cell
+    solved[key] = (best_score, best_cell)
+    return best_score
+
+
+def sample_endgames(length: int, games: int, empty_cells: int,
+                    solved: Dict[int, Tuple[int, int]],
+                    seed: int = 0) -> None:
+    """
+    Play games random games on a gameboard of side length length until
+    empty_cells cells are left, and add the states reachable from there to
+    solved as solve does. The random moves are drawn from a generator seeded
+    by seed.
+
+    >>> solved = {}
+    >>> sample_endgames(3, 2, 4, solved)
+    >>> len(solved)
+    16
+    """
+    choose = random.Random(seed).choice
+    for game in range(games):
+        state = StonehengeState(game % 2 == 0, length)
+        while not state.game_over() and state.empty_cells > empty_cells:
+            state = state.make_move(choose(state.get_possible_cells()))
+        solve(state, solved)
+
+
+def write_book(solved: Dict[int, Tuple[int, int]], path: str) -> None:
+    """
+    Write the states in solved, as filled in by solve, to a book at path.
+    """
+    with open(path, 'wb') as file:
+        file.write(_HEADER.pack(MAGIC, len(solved)))
+        for key in sorted(solved):
+            score, cell = solved[key]
+            file.write(_RECORD.pack(key, score, cell))
+
+
+def build_book(path: str, lengths: Iterable[int] = (1, 2, 3),
+               sample_lengths: Iterable[int] = (), games: int = 0,
+               empty_cells: int = 8, seed: int = 0) -> int:
+    """
+    Write a book to path solving every state of gameboards with side
+    lengths in lengths, and the endgames of games random games with
+    empty_cells cells left on each gameboard with side length in
+    sample_lengths. Return the number of states written.
+
+    >>> import tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), 'book.bin')
+    >>> build_book(path, [2])
+    2596
+    >>> book = OpeningBook(path)
+    >>> book.lookup(StonehengeState(True, 2)), len(book)
+    ((1, 0), 2596)
+    >>> book.lookup(StonehengeState(True, 3)) is None
+    True
+    >>> book.close()
+    """
+    solved = {}
+    for length in lengths:
+        solve(StonehengeState(True, length), solved)
+        solve(StonehengeState(False, length), solved)
+    for length in sample_lengths:
+        sample_endgames(length, games, empty_cells, solved, seed)
+    write_book(solved, path)
+    return len(solved)
+
+
+# the book used by book_strategy, opened when first needed
+_book = None
+
+
+def opening_book(path: str = None) -> Optional[OpeningBook]:
+    """
+    Return the book at path, or at DEFAULT_PATH if path is not given,
+    sharing one OpeningBook per path, or None if there is no book there.
+    """
+    global _book
+    if path is None:
+        path = DEFAULT_PATH
+    if _book is None or _book.path != path:
+        if not os.path.exists(path):
+            return None
+        if _book is not None:
+            _book.close()
+        _book = OpeningBook(path)
+    return _book
+
+
+@instrumented
+def book_strategy(game: Game) -> Any:
+    """
+    Return the best move of game's current state from the book at
+    DEFAULT_PATH, or the move of alpha_beta_strategy if the state is not in
+    the book or there is no book.
+    """
+    state = game.current_state
+    book = opening_book()
+    if isinstance(state, StonehengeState) and book is not None:
+        entry = book.lookup(state)
+        if entry is not None:
+            return state.topology.labels[entry[1]]
+    return alpha_beta_strategy(game)
+
+
+def main(args: Any = None) -> None:
+    """
+    Build a book described by the command line arguments args.
+    """
+    parser = argparse.ArgumentParser(
+        description='Solve Stonehenge positions into a book.')
+    parser.add_argument('-o', '--output', default=DEFAULT_PATH)
+    parser.add_argument('--lengths', type=int, nargs='*', default=[1, 2, 3],
+                        help='side lengths to solve completely')
+    parser.add_argument('--sample', type=int, nargs='*', default=[],
+                        help='side lengths to solve random endgames of')
+    parser.add_argument('--games', type=int, default=100,
+                        help='random games played for every sampled length')
+    parser.add_argument('--empty', type=int, default=8,
+                        help='cells left when an endgame is solved')
+    parser.add_argument('--seed', type=int, default=0)
+    options = parser.parse_args(args)
+    count = build_book(options.output, options.lengths, options.sample,
+                       options.games, options.empty, options.seed)
+    print('wrote {} states to {}'.format(count, options.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -16,13 +16,20 @@ class StonehengeGame(Game):
     length: int
     current_state: StonehengeState
 
-    def __init__(self, p1_starts: bool) -> None:
+    def __init__(self, p1_starts: bool, length: int = None) -> None:
         """
         Initialize this Game, using p1_starts to find who the first player is.
+        The side length of the gameboard is asked for unless length is given.
         Overrides Game.__init__(self, p1_starts)
+
+        >>> game = StonehengeGame(True, 2)
+        >>> game.current_state.get_possible_moves()
+        ['A', 'B', 'C', 'D', 'E', 'F', 'G']
         """
-        length = input('Please input the side lenght of gameboard:')
-        self.current_state = StonehengeState(p1_starts, int(length))
+        if length is None:
+            length = input('Please input the side lenght of gameboard:')
+        self.length = int(length)
+        self.current_state = StonehengeState(p1_starts, self.length)
 
     def __eq__(self, other: Any) -> bool:
         """
@@ -68,15 +75,16 @@ class StonehengeGame(Game):
 
     def is_over(self, state: StonehengeState) -> bool:
         """
-        Return whether or not this game is over.
+        Return whether or not this game is over at state.
         Override Game.is_over(self)
+
+        >>> game = StonehengeGame(True, 1)
+        >>> game.is_over(game.current_state.make_move('A'))
+        True
+        >>> game.is_over(game.current_state)
+        False
         """
-        result = False
-        if (state.p1_count / state.total_leylines >= 0.5
-                or state.p2_count / state.total_leylines >= 0.5
-                or self.current_state.get_possible_moves() == []):
-            result = True
-        return result
+        return state.game_over()
 
     def is_winner(self, player: str) -> bool:
         """
@@ -92,12 +100,14 @@ class StonehengeGame(Game):
         Return the move that string represents. If string is not a move,
         return an invalid move.
         Override Game.str_to_move(self, string)
+
+        >>> game = StonehengeGame(True, 1)
+        >>> game.str_to_move(' b ')
+        'B'
+        >>> game.current_state.is_valid_move(game.str_to_move('?'))
+        False
         """
-        result = str(move_to_make).upper().strip()
-        while not result.isalpha() or len(result) != 1:
-            result = input('Please enter a valid move:')
-            self.string_to_move(result)
-        return result
+        return str(move_to_make).upper().strip()
 
 
 if __name__ == "__main__":
@@ -1,9 +1,17 @@
 """
 subclass StonehengeState of Gamestate
 """
-from typing import Any, List
+import random
+from itertools import permutations, product
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 from game_state import GameState
-import copy
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# child_outcomes scores fewer moves than this one by one, which is faster
+BATCH_MIN_MOVES = 8
 
 
 class Cellnode:
@@ -15,6 +23,7 @@ class Cellnode:
     right_up: the right up cell of a Cellnode
     right_down: the right down cell of a Cellnode
     """
+    __slots__ = ('value', 'left', 'right_up', 'right_down')
     value: str
     left: int or str
     right_up: int or str
@@ -41,27 +50,393 @@ class Cellnode:
         self.right_down = right_down
 
 
+class BoardTopology:
+    """
+    The layout of a Stonehenge gameboard of one side length, built once and
+    shared by every state on such a gameboard. It must not be changed.
+
+    Cells are numbered row by row from the top of the gameboard. Leylines
+    are numbered rows first, then left diagonals, then right diagonals.
+
+    length: side length of the gameboard
+    labels: the label of every cell
+    index: the cell of every label
+    leylines: the cells of every leyline
+    masks: the bitmask of the cells of every leyline
+    cell_leylines: the leylines through every cell
+    total_leylines: the total number of leylines in the gameboard
+    display: the rows of values shown by StonehengeState.lines_copy, each
+             value a cell, or a leyline numbered after the cells
+    layout: the text of the drawn gameboard around its values
+    slots: the value drawn between each piece of layout and the next, as
+           in display
+    width: the odd number of characters every drawn value is centred in
+    symmetries: the cell every cell moves to and the leyline every leyline
+                moves to under each rotation and reflection, the identity
+                first
+    empty_key: the Zobrist key of the empty gameboard
+    turn_key: the Zobrist key for player 1 to move
+    cell_keys: the Zobrist key of every cell for each player who claims it
+    line_keys: the Zobrist key of every leyline for each player who claims
+               it
+    incidence: a read-only numpy array with a row for every leyline and a
+               column for every cell, 1 where the cell is on the leyline;
+               None without NumPy
+    """
+    __slots__ = ('length', 'labels', 'index', 'leylines', 'masks',
+                 'cell_leylines', 'total_leylines', 'display', 'layout',
+                 'slots', 'width', 'symmetries',
+                 'empty_key', 'turn_key', 'cell_keys', 'line_keys',
+                 'incidence')
+    length: int
+    labels: Tuple[str, ...]
+    index: Dict[str, int]
+    leylines: Tuple[Tuple[int, ...], ...]
+    masks: Tuple[int, ...]
+    cell_leylines: Tuple[Tuple[int, ...], ...]
+    total_leylines: int
+    display: Tuple[Tuple[int, ...], ...]
+    layout: Tuple[str, ...]
+    slots: Tuple[int, ...]
+    width: int
+    symmetries: Tuple[Tuple[Tuple[int, ...], Tuple[int, ...]], ...]
+    empty_key: int
+    turn_key: int
+    cell_keys: Dict[str, Tuple[int, ...]]
+    line_keys: Dict[str, Tuple[int, ...]]
+    incidence: Any
+
+    def __init__(self, length: int) -> None:
+        """
+        Build the BoardTopology self of a gameboard with side length length.
+        Use board_topology to share one per side length instead.
+
+        >>> topology = BoardTopology(1)
+        >>> topology.labels
+        ('A', 'B', 'C')
+        >>> topology.leylines
+        ((0, 1), (2,), (0,), (1, 2), (1,), (0, 2))
+        >>> topology.masks
+        (3, 4, 1, 6, 2, 5)
+        >>> topology.cell_leylines[topology.index['C']]
+        (1, 3, 5)
+        >>> topology.length = 2
+        Traceback (most recent call last):
+        ...
+        AttributeError: BoardTopology is immutable
+        """
+        # a cell is (row, column) on the triangular grid; the last row has
+        # lost its first corner, so its columns start at 1
+        cells = []
+        for row in range(length):
+            cells.extend((row, column) for column in range(row + 2))
+        cells.extend((length, column) for column in range(1, length + 1))
+
+        labels = tuple(_cell_label(i) for i in range(len(cells)))
+        leylines = [tuple(i for i, cell in enumerate(cells) if cell[0] == row)
+                    for row in range(length + 1)]
+        leylines += [tuple(i for i, cell in enumerate(cells)
+                           if cell[1] == column)
+                     for column in range(length + 1)]
+        leylines += [tuple(i for i, cell in enumerate(cells)
+                           if cell[0] - cell[1] + 1 == diagonal)
+                     for diagonal in range(length + 1)]
+        cell_leylines = tuple(tuple(j for j, line in enumerate(leylines)
+                                    if i in line)
+                              for i in range(len(cells)))
+
+        # the Zobrist keys are drawn from a generator seeded by length, so a
+        # state hashes the same in every process
+        draw = random.Random('stonehenge-{}'.format(length)).getrandbits
+        empty_key = draw(64)
+        turn_key = draw(64)
+        cell_keys = {player: tuple(draw(64) for _ in cells)
+                     for player in '12'}
+        line_keys = {player: tuple(draw(64) for _ in leylines)
+                     for player in '12'}
+
+        fields = {'length': length,
+                  'labels': labels,
+                  'index': {label: i for i, label in enumerate(labels)},
+                  'leylines': tuple(leylines),
+                  'masks': tuple(sum(1 << i for i in line)
+                                 for line in leylines),
+                  'cell_leylines': cell_leylines,
+                  'total_leylines': len(leylines),
+                  'display': _display_rows(length, len(cells), leylines),
+                  'width': max(len(label) for label in labels) // 2 * 2 + 1,
+                  'symmetries': _find_symmetries(length, cell_leylines),
+                  'empty_key': empty_key,
+                  'turn_key': turn_key,
+                  'cell_keys': cell_keys,
+                  'line_keys': line_keys}
+        fields['layout'], fields['slots'] = _drawing(
+            length, cells, leylines, fields['width'])
+        fields['incidence'] = None
+        if np is not None:
+            incidence = np.zeros((len(leylines), len(cells)), dtype=np.int64)
+            for line, line_cells in enumerate(leylines):
+                incidence[line, list(line_cells)] = 1
+            incidence.flags.writeable = False
+            fields['incidence'] = incidence
+        for name, value in fields.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        """
+        Refuse to change BoardTopology self, which is shared by every state
+        on its gameboard.
+        """
+        raise AttributeError('BoardTopology is immutable')
+
+    def __reduce__(self) -> Tuple[Any, Tuple[int]]:
+        """
+        Pickle BoardTopology self as its side length, so that a process
+        receiving a state shares the topology it already has.
+
+        >>> import pickle
+        >>> pickle.loads(pickle.dumps(board_topology(2))) is board_topology(2)
+        True
+        """
+        return board_topology, (self.length,)
+
+    def __repr__(self) -> str:
+        """
+        Return a representation of BoardTopology self.
+
+        >>> board_topology(3)
+        BoardTopology(3)
+        """
+        return 'BoardTopology({})'.format(self.length)
+
+
+# helper function to name a cell
+def _cell_label(cell: int) -> str:
+    """
+    Return the label of the cell numbered cell: the letters A to Z, then
+    AA, AB and so on.
+
+    >>> [_cell_label(i) for i in (0, 25, 26, 27, 52, 701, 702)]
+    ['A', 'Z', 'AA', 'AB', 'BA', 'ZZ', 'AAA']
+    """
+    label = ''
+    cell += 1
+    while cell:
+        cell, letter = divmod(cell - 1, 26)
+        label = chr(65 + letter) + label
+    return label
+
+
+# helper function to lay out the text of a drawn gameboard
+def _drawing(length: int, cells: List[Tuple[int, int]],
+             leylines: List[Tuple[int, ...]],
+             width: int) -> Tuple[Tuple[str, ...], Tuple[int, ...]]:
+    """
+    Return the layout and slots of BoardTopology for a gameboard of side
+    length length with the cells at (row, column) in cells, drawing every
+    value centred in width characters, an odd number.
+
+    Every value sits at a (row, column) of the triangular grid: a leyline's
+    marker sits just past the end of its leyline. The values of a row are
+    joined by '-', and those of a left or right diagonal by '/' or '\\'.
+
+    >>> layout, slots = _drawing(1, [(0, 0), (0, 1), (1, 1)],
+    ...                          [(0, 1), (2,), (0,), (1, 2), (1,), (0, 2)], 1)
+    >>> slots
+    (5, 6, 3, 0, 1, 4, 2, 7, 8)
+    >>> layout[:2], len(layout) == len(slots) + 1
+    (('      ', '   '), True)
+    """
+    # half the distance between neighbouring values in a row
+    half = (width + 3) // 2
+
+    def place(row: int, column: int) -> Tuple[int, int]:
+        """
+        Return the line and the character of the text that the value at
+        (row, column) is drawn from.
+        """
+        return 2 * row + 2, (2 * column + 2 + length - 1 - row) * half
+
+    n = length + 1
+    values = {len(cells) + i: place(cells[line[0]][0],
+                                    cells[line[0]][1] - 1)
+              for i, line in enumerate(leylines[:n])}
+    values.update({len(cells) + n + i: place(cells[line[0]][0] - 1, i)
+                   for i, line in enumerate(leylines[n:2 * n])})
+    values.update({len(cells) + 2 * n + i: place(cells[line[-1]][0] + 1,
+                                                 cells[line[-1]][1] + 1)
+                   for i, line in enumerate(leylines[2 * n:])})
+    values.update({i: place(*cell) for i, cell in enumerate(cells)})
+
+    # the characters joining neighbouring values of each leyline
+    lines = [[' '] * ((2 * length + 3) * half + width)
+             for _ in range(2 * length + 5)]
+    for i, line in enumerate(leylines):
+        marker = len(cells) + i
+        if i < 2 * n:
+            ends = [marker] + list(line)
+        else:
+            ends = list(line) + [marker]
+        for first, second in zip(ends, ends[1:]):
+            (line_1, char_1), (line_2, char_2) = values[first], values[second]
+            if line_1 == line_2:
+                lines[line_1][(char_1 + char_2 + width) // 2] = '-'
+            else:
+                lines[line_1 + 1][(char_1 + char_2 + width) // 2] = \
+                    '/' if char_2 < char_1 else '\\'
+
+    # cut the text at every value, in reading order
+    order = sorted(values, key=lambda value: values[value])
+    layout = []
+    piece = ''
+    for number, line in enumerate(lines):
+        start = 0
+        for value in order:
+            if values[value][0] == number:
+                char = values[value][1]
+                layout.append(piece + ''.join(line[start:char]))
+                piece = ''
+                start = char + width
+        piece += ''.join(line[start:]).rstrip()
+        if number < len(lines) - 1:
+            piece += '\n'
+    layout.append(piece)
+    return tuple(layout), tuple(order)
+
+
+# helper function to lay out the values shown by lines_copy
+def _display_rows(length: int, cells: int,
+                  leylines: List[Tuple[int, ...]]) -> Tuple[Tuple[int, ...],
+                                                            ...]:
+    """
+    Return the rows of values of a gameboard with side length length in the
+    order they are displayed, numbering each leyline after the cells.
+
+    >>> _display_rows(1, 3, [(0, 1), (2,), (0,), (1, 2), (1,), (0, 2)])
+    ((5, 6), (3, 0, 1), (4, 2, 7), (8,))
+    """
+    left = cells + length + 1
+    right = cells + 2 * length + 2
+    result = [[left, left + 1]]
+    for row in range(length + 1):
+        result.append([cells + row] + list(leylines[row]))
+        if row < length - 1:
+            result[-1].append(left + row + 2)
+    result[-1].append(right)
+    result.append([right + i for i in range(length, 0, -1)])
+    return tuple(tuple(row) for row in result)
+
+
+# helper function to find the rotations and reflections of a gameboard
+def _find_symmetries(length: int, cell_leylines: Tuple[Tuple[int, ...], ...]
+                     ) -> Tuple[Tuple[Tuple[int, ...], Tuple[int, ...]], ...]:
+    """
+    Return the rotations and reflections of a gameboard with side length
+    length whose cells lie on cell_leylines, as for
+    BoardTopology.symmetries.
+
+    A symmetry sends each of the three directions of leylines to a
+    direction, keeping or reversing the order of its parallel leylines, so
+    the candidates are tried and kept when they move every cell to a cell.
+
+    >>> len(_find_symmetries(1, ((0, 2, 5), (0, 3, 4), (1, 3, 5))))
+    6
+    """
+    n = length + 1
+    # a cell is its leyline in each direction, counted within the direction
+    cells = {tuple(line - direction * n for direction, line
+                   in enumerate(lines)): i
+             for i, lines in enumerate(cell_leylines)}
+    result = []
+    for order in permutations(range(3)):
+        for flips in product((False, True), repeat=3):
+            line_moves = [0] * (3 * n)
+            for direction in range(3):
+                for i in range(n):
+                    line_moves[order[direction] * n + i] = \
+                        direction * n + (length - i if flips[direction]
+                                         else i)
+            cell_moves = []
+            for cell in cells:
+                moved = [0, 0, 0]
+                for direction in range(3):
+                    line = line_moves[direction * n + cell[direction]]
+                    moved[line // n] = line % n
+                cell_moves.append(cells.get(tuple(moved)))
+            if None not in cell_moves and len(set(cell_moves)) == len(cells):
+                result.append((tuple(cell_moves), tuple(line_moves)))
+    return tuple(result)
+
+
+# topologies already built, keyed by side length
+_TOPOLOGIES: Dict[int, BoardTopology] = {}
+
+
+def board_topology(length: int) -> BoardTopology:
+    """
+    Return the BoardTopology of a gameboard with side length length, built
+    the first time it is asked for.
+
+    >>> board_topology(2) is board_topology(2)
+    True
+    >>> board_topology(2).total_leylines
+    9
+    """
+    if length not in _TOPOLOGIES:
+        _TOPOLOGIES[length] = BoardTopology(length)
+    return _TOPOLOGIES[length]
+
+
+def board_symmetries(length: int) -> Tuple[Tuple[Tuple[int, ...],
+                                                 Tuple[int, ...]], ...]:
+    """
+    Return the rotations and reflections of a gameboard with side length
+    length, each as the cell every cell moves to and the leyline every
+    leyline moves to. The identity comes first.
+
+    >>> len(board_symmetries(2)), len(board_symmetries(3))
+    (12, 6)
+    >>> board_symmetries(1)[0]
+    ((0, 1, 2), (0, 1, 2, 3, 4, 5))
+    """
+    return board_topology(length).symmetries
+
+
 class StonehengeState(GameState):
     """
     The state of a game Stonehenge at a certain point in time.
 
-    length: side length of a game board
+    make_move never changes a state: it returns a new state sharing the
+    topology, and the leyline markers while none is claimed, with the state
+    it was made from. apply and undo change a state in place instead, so a
+    state must not be kept in a set or dict while they change it.
+
+    topology: the layout of the gameboard, shared by every state on it
     p1_count: the number of leylines that player 1 captured
     p2_count: the number of leylines that player 2 captured
-    total_leylines: the total number of leylines in a gameboard
-    lines: line of cells in a gameboard
-    lines_copy: the list copy of values of cells on the gameboard
-    left_diagonal: list of cells forming left diagonal
-    right_diagonal: list of cells forming right diagonal
+    p1_cells: bitmask of the cells claimed by player 1
+    p2_cells: bitmask of the cells claimed by player 2
+    leylines: the marker of every leyline, '@' while unclaimed and then the
+              player who claimed it
+    zobrist: the Zobrist hash of the state, updated by every move
+    empty_cells: the number of cells not yet claimed
+    over: whether the game is over, found once when the state is made
+    move_stack: what apply changed, for every move not yet undone, or None
+                before apply is first called
     """
-    length: int
+    __slots__ = ('topology', 'p1_count', 'p2_count', 'p1_cells', 'p2_cells',
+                 'leylines', 'zobrist', 'empty_cells', 'over', 'move_stack')
+    topology: BoardTopology
     p1_count: int
     p2_count: int
-    total_leylines: int
-    lines: List[List[Cellnode]]
-    lines_copy: List[List]
-    left_diagonal: List[List[Cellnode]]
-    right_diagonal: List[List[Cellnode]]
+    p1_cells: int
+    p2_cells: int
+    leylines: Tuple[str, ...]
+    zobrist: int
+    empty_cells: int
+    over: bool
+    move_stack: Optional[List[Tuple[int, Tuple[str, ...], int, int, int,
+                                    bool]]]
 
     def __init__(self, is_p1_turn: bool, length: int) -> None:
         """
@@ -75,78 +450,127 @@ class StonehengeState(GameState):
         [['@', '@'], ['@', 'A', 'B'], ['@', 'C', '@'], ['@']]
         """
         GameState.__init__(self, is_p1_turn)
-        self.length = length
+        self.topology = board_topology(length)
         self.p1_count = 0
         self.p2_count = 0
-        self.total_leylines = 0
-        self.lines = []
-        self.left_diagonal = []
-        self.right_diagonal = []
-        self.lines_copy = []
-
-        # build up lines
-        a = 65
-        step = 2
-        for i in range(self.length):
-            self.lines.append([Cellnode(chr(a + j), 0, 0, 0) for j
-                               in range(step)])
-            self.lines_copy.append([chr(a+j) for j in range(step)])
-            a += step
-            step += 1
-        self.lines.append([Cellnode(chr(a + i), 0, 0, 0)
-                           for i in range(step - 2)])
-        self.lines_copy.append([chr(a + i) for i in range(step - 2)])
-
-        # add @
-        for i in range(len(self.lines)):
-            self.lines[i][0].left = '@'
-            self.lines_copy[i] = ['@'] + self.lines_copy[i]
-            self.total_leylines += 1
-        self.lines[0][0].right_up = '@'
-        self.lines_copy = [['@', '@']] + self.lines_copy
-        for i in range(self.length):
-            self.lines[i][-1].right_up = '@'
-            self.total_leylines += 1
-        if self.length >= 2:
-            for i in range(1, self.length):
-                self.lines_copy[i] += ['@']
-        self.lines_copy[-1] += ['@']
-        self.lines[-2][-1].right_down = '@'
-        for node in self.lines[-1]:
-            node.right_down = '@'
-            self.total_leylines += 1
-        self.lines_copy += [['@'] * self.length]
-        self.total_leylines += 2
-
-        # build up left_diagonal
-        self.left_diagonal.append([self.lines[i][0]
-                                   for i in range(self.length)])
-        j = 1
-        step_l = 0
-        if self.length >= 2:
-            for i in range(1, self.length + 1):
-                self.left_diagonal.append([self.lines[z][j]
-                                           for z in range(step_l,
-                                                          self.length)])
-                j += 1
-                step_l += 1
-        else:
-            self.left_diagonal.append([self.lines[0][-1]])
-        for i in range(1, len(self.left_diagonal)):
-            self.left_diagonal[i].append(self.lines[-1][i - 1])
-
-        # build up right_diagonal
-        self.right_diagonal.append([self.lines[i][-1]
-                                    for i in range(self.length)])
-        step_r = 0
-        for i in range(self.length - 1):
-            self.right_diagonal.append([self.lines[j][-(i + 2)]
-                                        for j in range(step_r, self.length)])
-            step_r += 1
-        if self.length >= 2:
-            for i in range(self.length - 1):
-                self.right_diagonal[i + 1] += [self.lines[-1][-(i + 1)]]
-        self.right_diagonal.append([self.lines[-2][0], self.lines[-1][0]])
+        self.p1_cells = 0
+        self.p2_cells = 0
+        self.leylines = ('@',) * self.topology.total_leylines
+        self.zobrist = self.topology.empty_key
+        if is_p1_turn:
+            self.zobrist ^= self.topology.turn_key
+        self.empty_cells = len(self.topology.labels)
+        self.over = False
+        self.move_stack = None
+
+    @property
+    def length(self) -> int:
+        """
+        Return the side length of the gameboard.
+
+        >>> StonehengeState(True, 3).length
+        3
+        """
+        return self.topology.length
+
+    @property
+    def total_leylines(self) -> int:
+        """
+        Return the total number of leylines in the gameboard.
+
+        >>> StonehengeState(True, 3).total_leylines
+        12
+        """
+        return self.topology.total_leylines
+
+    @property
+    def lines_copy(self) -> List[List[str]]:
+        """
+        Return the values of the cells and leylines of the gameboard, row by
+        row in the order they are displayed.
+
+        >>> state = StonehengeState(True, 2).make_move('A')
+        >>> state.lines_copy[:3]
+        [['1', '@'], ['1', '1', 'B', '@'], ['@', 'C', 'D', 'E']]
+        """
+        values = self._cell_values() + list(self.leylines)
+        return [[values[i] for i in row] for row in self.topology.display]
+
+    @property
+    def lines(self) -> List[List[Cellnode]]:
+        """
+        Return the rows of cells of the gameboard.
+
+        >>> state = StonehengeState(True, 1)
+        >>> [[node.value for node in line] for line in state.lines]
+        [['A', 'B'], ['C']]
+        """
+        return self._cellnodes()[0]
+
+    @property
+    def left_diagonal(self) -> List[List[Cellnode]]:
+        """
+        Return the left diagonals of cells of the gameboard.
+
+        >>> state = StonehengeState(True, 1)
+        >>> [[node.value for node in line] for line in state.left_diagonal]
+        [['A'], ['B', 'C']]
+        """
+        return self._cellnodes()[1]
+
+    @property
+    def right_diagonal(self) -> List[List[Cellnode]]:
+        """
+        Return the right diagonals of cells of the gameboard.
+
+        >>> state = StonehengeState(True, 1)
+        >>> [[node.value for node in line] for line in state.right_diagonal]
+        [['B'], ['A', 'C']]
+        """
+        return self._cellnodes()[2]
+
+    # helper function to find the value shown in every cell
+    def _cell_values(self) -> List[str]:
+        """
+        Return the label of every unclaimed cell, or the player who claimed
+        it, in cell order.
+
+        >>> StonehengeState(True, 1).make_move('B')._cell_values()
+        ['A', '1', 'C']
+        """
+        result = []
+        for i, label in enumerate(self.topology.labels):
+            if self.p1_cells >> i & 1:
+                result.append('1')
+            elif self.p2_cells >> i & 1:
+                result.append('2')
+            else:
+                result.append(label)
+        return result
+
+    # helper function to build Cellnode views of the gameboard
+    def _cellnodes(self) -> Tuple[List[List[Cellnode]], List[List[Cellnode]],
+                                  List[List[Cellnode]]]:
+        """
+        Return the rows, left diagonals and right diagonals of the gameboard
+        as lists of Cellnode, with each leyline marker stored on the cell at
+        its end.
+
+        >>> rows, left, right = StonehengeState(True, 1)._cellnodes()
+        >>> rows[0][0].left, left[1][0].right_up, right[1][-1].right_down
+        ('@', '@', '@')
+        """
+        leylines = self.topology.leylines
+        nodes = [Cellnode(value, 0, 0, 0) for value in self._cell_values()]
+        n = self.length + 1
+        for i in range(n):
+            nodes[leylines[i][0]].left = self.leylines[i]
+            nodes[leylines[n + i][0]].right_up = self.leylines[n + i]
+            nodes[leylines[2 * n + i][-1]].right_down = \
+                self.leylines[2 * n + i]
+        return ([[nodes[j] for j in line] for line in leylines[:n]],
+                [[nodes[j] for j in line] for line in leylines[n:2 * n]],
+                [[nodes[j] for j in line] for line in leylines[2 * n:]])
 
     def __eq__(self, other: Any) -> bool:
         """
@@ -161,9 +585,48 @@ class StonehengeState(GameState):
         False
         """
         return (type(self) == type(other)
+                and self.zobrist == other.zobrist
                 and self.p1_turn == other.p1_turn
-                and self.length == other.length
-                and self.lines_copy == other.lines_copy)
+                and self.topology is other.topology
+                and self.p1_cells == other.p1_cells
+                and self.p2_cells == other.p2_cells
+                and self.leylines == other.leylines)
+
+    def __hash__(self) -> int:
+        """
+        Return a hash of StonehengeState self, equal for equivalent states.
+
+        >>> state = StonehengeState(True, 2).make_move('A')
+        >>> hash(state) == hash(StonehengeState(True, 2).make_move('A'))
+        True
+        >>> hash(state.make_move('B')) == hash(state.make_move('C'))
+        False
+        """
+        return self.zobrist
+
+    def to_bytes(self) -> bytes:
+        """
+        Return a compact serialisation of StonehengeState self, read back by
+        state_from_bytes: the side length, whose turn it is, and bitmasks of
+        the cells and the leylines claimed by each player.
+
+        >>> state = StonehengeState(True, 5).make_move('A')
+        >>> len(state.to_bytes())
+        16
+        >>> state_from_bytes(state.to_bytes()) == state
+        True
+        """
+        cell_bytes = (len(self.topology.labels) + 7) // 8
+        line_bytes = (self.total_leylines + 7) // 8
+        p1_lines = sum(1 << i for i, mark in enumerate(self.leylines)
+                       if mark == '1')
+        p2_lines = sum(1 << i for i, mark in enumerate(self.leylines)
+                       if mark == '2')
+        return (bytes([self.length, self.p1_turn])
+                + self.p1_cells.to_bytes(cell_bytes, 'little')
+                + self.p2_cells.to_bytes(cell_bytes, 'little')
+                + p1_lines.to_bytes(line_bytes, 'little')
+                + p2_lines.to_bytes(line_bytes, 'little'))
 
     def __str__(self) -> str:
         """
@@ -172,92 +635,35 @@ class StonehengeState(GameState):
 
         >>> state = StonehengeState(True, 1)
         >>> print(state)
-                  @   @
-                 /   /
-            @ - A - B
-                 \\ / \\
-               @ - C   @
-                   \\
-                    @
-        """
-        template_1 = \
-            """\
-                  {}   {}
-                 /   /
-            {} - {} - {}
-                 \\ / \\
-              {} - {}   {}
-                   \\
-                    {}"""
-
-        template_2 = \
-            """\
-                    {}   {}
-                   /   /
-              {} - {} - {}   {}
-                 / \\ / \\ /
-            {} - {} - {} - {}
-                 \\ / \\ / \\
-              {} - {} - {}   {}
-                   \\   \\
-                    {}   {}"""
-        template_3 = \
-            """\
-                  {}   {}
-                 /   /
-            {} - {} - {}   {}
-               / \\ / \\ /
-          {} - {} - {} - {}   {}
-             / \\ / \\ / \\ /
-        {} - {} - {} - {} - {}
-             \\ / \\ / \\ / \\
-          {} - {} - {} - {}   {}
-               \\   \\   \\
-                {}   {}  {}"""
-        template_4 = \
-            """\
-                  {}   {}
-                /   /
-           {} - {} - {}   {}
-              / \\ / \\ /
-         {} - {} - {} - {}   {}
-            / \\ / \\ / \\ /
-       {} - {} - {} - {} - {}   {}
-          / \\ / \\ / \\ / \\ /
-     {} - {} - {} - {} - {} - {}
-          \\ / \\ / \\ / \\ / \\
-       {} - {} - {} - {} - {}   {}
-            \\   \\   \\   \\
-             {}   {}   {}   {}"""
-        template_5 = \
-            """\
-                  {}   {}
-                 /   /
-            {} - {} - {}   {}
-               / \\ / \\ /
-          {} - {} - {} - {}   {}
-             / \\ / \\ / \\ /
-        {} - {} - {} - {} - {}   {}
-           / \\ / \\ / \\ / \\ /
-       {} - {} - {} - {} - {} - {}   {}
-          / \\ / \\ / \\ / \\ / \\ /
-     {} - {} - {} - {} - {} - {} - {}
-          \\ / \\ / \\ / \\ / \\ / \\
-       {} - {} - {} - {} - {} -{}    {}
-            \\   \\   \\   \\  \\
-             {}   {}   {}   {}  {}"""
-        lines = self.lines_copy
-        lines_gather = sum([list_1 for list_1 in lines], [])
-        if self.length == 1:
-            return template_1.format(*lines_gather)
-        if self.length == 2:
-            return template_2.format(*lines_gather)
-        if self.length == 3:
-            return template_3.format(*lines_gather)
-        if self.length == 4:
-            return template_4.format(*lines_gather)
-        if self.length == 5:
-            return template_5.format(*lines_gather)
+              @   @
+             /   /
+        @ - A - B
+             \\ / \\
+          @ - C   @
+               \\
+                @
+        >>> print(StonehengeState(True, 2).make_move('E'))
+                @   @
+               /   /
+          @ - A - B   1
+             / \\ / \\ /
+        @ - C - D - 1
+             \\ / \\ / \\
+          @ - F - G   1
+               \\   \\
+                @   @
+        """
+        topology = self.topology
+        values = self._cell_values() + list(self.leylines)
+        width = topology.width
+        pieces = [topology.layout[0]]
+        for value, text in zip(topology.slots, topology.layout[1:]):
+            pieces.append(values[value].center(width))
+            pieces.append(text)
+        if width == 1:
+            return ''.join(pieces)
+        return '\n'.join(line.rstrip()
+                         for line in ''.join(pieces).split('\n'))
 
     def get_possible_moves(self) -> list:
         """
@@ -274,15 +680,68 @@ class StonehengeState(GameState):
         >>> state_13.get_possible_moves()
         ['B', 'C', 'E', 'G']
         """
+        labels = self.topology.labels
+        return [labels[cell] for cell in self.get_possible_cells()]
+
+    def get_possible_cells(self) -> List[int]:
+        """
+        Return the cells that can be claimed from this state, as indices
+        into self.topology.labels.
+
+        >>> state = StonehengeState(True, 2).make_move('B')
+        >>> state.get_possible_cells()
+        [0, 2, 3, 4, 5, 6]
+        >>> StonehengeState(True, 1).make_move(1).get_possible_cells()
+        []
+        """
+        if self.over:
+            return []
+        free = ~(self.p1_cells | self.p2_cells) & ((1 << len(
+            self.topology.labels)) - 1)
         result = []
-        if (self.p1_count / self.total_leylines < 0.5
-                and self.p2_count / self.total_leylines < 0.5):
-            for line in self.lines:
-                for item in line:
-                    if item.value.isalpha():
-                        result.append(item.value)
+        while free:
+            low = free & -free
+            result.append(low.bit_length() - 1)
+            free ^= low
         return result
 
+    def is_valid_move(self, move: Any) -> bool:
+        """
+        Return whether move, a cell label or index, can be made from this
+        state.
+        Override GameState.is_valid_move(self, move)
+
+        >>> state = StonehengeState(True, 2).make_move('B')
+        >>> state.is_valid_move('A'), state.is_valid_move(0)
+        (True, True)
+        >>> state.is_valid_move('B'), state.is_valid_move(7)
+        (False, False)
+        >>> state.is_valid_move(None)
+        False
+        """
+        cell = self._cell_of(move)
+        return (cell is not None and not self.over
+                and not (self.p1_cells | self.p2_cells) >> cell & 1)
+
+    # helper function to find the cell a move claims
+    def _cell_of(self, move: Any) -> Optional[int]:
+        """
+        Return the index of the cell that move, a cell label or index, claims
+        on this gameboard, or None if there is no such cell.
+
+        >>> state = StonehengeState(True, 1)
+        >>> state._cell_of('C'), state._cell_of(1), state._cell_of('Z')
+        (2, 1, None)
+        """
+        if isinstance(move, int):
+            if 0 <= move < len(self.topology.labels):
+                return move
+            return None
+        try:
+            return self.topology.index.get(move)
+        except TypeError:
+            return None
+
     # helper function to accumulate number of leylines gained
     def new_gain(self, current_player_name: str) -> None:
         """
@@ -297,12 +756,73 @@ class StonehengeState(GameState):
         """
         if current_player_name == 'p1':
             self.p1_count += 1
+            count = self.p1_count
         else:
             self.p2_count += 1
+            count = self.p2_count
+        if 2 * count >= self.topology.total_leylines:
+            self.over = True
+
+    def symmetric(self, symmetry: int) -> "StonehengeState":
+        """
+        Return this state with its gameboard moved by the symmetry numbered
+        symmetry in board_symmetries(self.length).
+
+        >>> state = StonehengeState(True, 1).make_move('A')
+        >>> [state.symmetric(i).lines_copy[1] for i in range(3)]
+        [['1', '1', 'B'], ['1', 'A', '1'], ['@', 'A', 'B']]
+        """
+        p1_cells, p2_cells, leylines = self.symmetric_fields(symmetry)
+        return _state_from_fields(self.p1_turn, self.length, p1_cells,
+                                  p2_cells, tuple(leylines))
+
+    def symmetric_fields(self, symmetry: int) -> Tuple[int, int, str]:
+        """
+        Return the cells of each player and the leyline markers of this state
+        with its gameboard moved by the symmetry numbered symmetry in
+        board_symmetries(self.length), without building the moved state.
+
+        >>> StonehengeState(True, 1).make_move('A').symmetric_fields(2)
+        (4, 0, '@1@1@1')
+        """
+        cell_moves, line_moves = self.topology.symmetries[symmetry]
+        cells = []
+        for mask in (self.p1_cells, self.p2_cells):
+            moved = 0
+            while mask:
+                low = mask & -mask
+                moved |= 1 << cell_moves[low.bit_length() - 1]
+                mask ^= low
+            cells.append(moved)
+        leylines = ['@'] * self.total_leylines
+        for i, moved in enumerate(line_moves):
+            leylines[moved] = self.leylines[i]
+        return cells[0], cells[1], ''.join(leylines)
+
+    def symmetric_move(self, move: Any, symmetry: int,
+                       inverse: bool = False) -> str:
+        """
+        Return the move that move becomes on the gameboard moved by the
+        symmetry numbered symmetry in board_symmetries(self.length), or the
+        move it came from if inverse.
+
+        >>> state = StonehengeState(True, 1)
+        >>> state.symmetric_move('A', 2)
+        'C'
+        >>> state.symmetric_move('C', 2, True)
+        'A'
+        """
+        topology = self.topology
+        cell_moves = topology.symmetries[symmetry][0]
+        if inverse:
+            return topology.labels[cell_moves.index(topology.index[move])]
+        return topology.labels[cell_moves[topology.index[move]]]
 
     def make_move(self, move: Any) -> "StonehengeState":
         """
-        Return the GameState that results from applying move to this GameState.
+        Return the GameState that results from applying move, a cell label
+        or index, to this GameState.
+        Only the three leylines through the claimed cell are checked.
         Override Gamestate.make_move(self)
 
         >>> state = StonehengeState(True, 1)
@@ -310,106 +830,103 @@ class StonehengeState(GameState):
         >>> line_1 = state_1.lines_copy
         >>> line_1
         [['1', '@'], ['1', '1', 'B'], ['@', 'C', '@'], ['1']]
+        >>> state.make_move(0) == state_1
+        True
+        """
+        # create a new state sharing everything with self, then play move
+        new_state = StonehengeState.__new__(StonehengeState)
+        new_state.p1_turn = self.p1_turn
+        new_state.topology = self.topology
+        new_state.p1_count = self.p1_count
+        new_state.p2_count = self.p2_count
+        new_state.p1_cells = self.p1_cells
+        new_state.p2_cells = self.p2_cells
+        new_state.leylines = self.leylines
+        new_state.zobrist = self.zobrist
+        new_state.empty_cells = self.empty_cells
+        new_state.move_stack = None
+        new_state._play(move if isinstance(move, int)
+                        else self.topology.index[move])
+        return new_state
 
+    def apply(self, move: Any) -> None:
         """
+        Apply move to this state in place, to be taken back by undo.
+        Override GameState.apply(self)
 
+        >>> state = StonehengeState(True, 2)
+        >>> state.apply('A')
+        >>> state.apply(1)
+        >>> state == StonehengeState(True, 2).make_move('A').make_move('B')
+        True
+        """
+        if self.move_stack is None:
+            self.move_stack = []
+        cell = move if isinstance(move, int) else self.topology.index[move]
+        self.move_stack.append((cell, self.leylines, self.zobrist,
+                                self.p1_count, self.p2_count, self.over))
+        self._play(cell)
+
+    def undo(self) -> None:
+        """
+        Take back the last move applied to this state and not yet undone.
+        Override GameState.undo(self)
+
+        >>> state = StonehengeState(True, 1)
+        >>> state.apply('A')
+        >>> state.game_over()
+        True
+        >>> state.undo()
+        >>> state == StonehengeState(True, 1), state.game_over()
+        (True, False)
+        """
+        if not self.move_stack:
+            raise ValueError('there is no move to undo')
+        (cell, self.leylines, self.zobrist, self.p1_count, self.p2_count,
+         self.over) = self.move_stack.pop()
+        self.p1_turn = not self.p1_turn
+        self.empty_cells += 1
+        if self.p1_turn:
+            self.p1_cells &= ~(1 << cell)
+        else:
+            self.p2_cells &= ~(1 << cell)
+
+    # helper function to play a move on this state in place
+    def _play(self, cell: int) -> None:
+        """
+        Claim cell for the current player, and every leyline through cell
+        they now hold half of, then pass the turn to the other player.
+        """
+        topology = self.topology
         player_name = self.get_current_player_name()
+        self.p1_turn = not self.p1_turn
+        self.empty_cells -= 1
+        self.over = self.empty_cells == 0
         if player_name == 'p1':
             player = '1'
-            p1_turn_mod = False
+            self.p1_cells |= 1 << cell
+            owned = self.p1_cells
         else:
             player = '2'
-            p1_turn_mod = True
+            self.p2_cells |= 1 << cell
+            owned = self.p2_cells
+        self.zobrist ^= topology.turn_key ^ topology.cell_keys[player][cell]
 
-        # create a new state
-        new_state = StonehengeState(p1_turn_mod, self.length)
-        new_state.p1_count = self.p1_count
-        new_state.p2_count = self.p2_count
-        new_state.total_leylines = self.total_leylines
-
-        # change in lines
-        line_result = copy.deepcopy(self.lines)
-        line_copy_result = []
-        index_node = 0
-        index_list = 0
-        gain = 0
-        for line in line_result:
-            for item in line:
-                if item.value == move:
-                    index_node = line.index(item)
-                    index_list = line_result.index(line)
-        line_result[index_list][index_node].value = player
-        for i in line_result[index_list]:
-            if i.value == player:
-                gain += 1
-        if gain / len(line_result[index_list]) >= 0.5:
-            if line_result[index_list][0].left == '@':
-                line_result[index_list][0].left = player
-                new_state.new_gain(player_name)
-
-        # lines in line_copy
-        for i in range(len(line_result)):
-            line_copy_result.append([line_result[i][j].value
-                                    for j in range(len(line_result[i]))])
-            line_copy_result[i] = [line_result[i][0].left] + line_copy_result[i]
-
-        # change in left diagonal
-        left_diagonal_result = copy.deepcopy(self.left_diagonal)
-        index_node_l = 0
-        index_list_l = 0
-        gain_l = 0
-        for diagonal in left_diagonal_result:
-            for item_l in diagonal:
-                if item_l.value == move:
-                    index_node_l = diagonal.index(item_l)
-                    index_list_l = left_diagonal_result.index(diagonal)
-        left_diagonal_result[index_list_l][index_node_l].value = player
-        for i in left_diagonal_result[index_list_l]:
-            if i.value == player:
-                gain_l += 1
-        if gain_l / len(left_diagonal_result[index_list_l]) >= 0.5:
-            if left_diagonal_result[index_list_l][0].right_up == '@':
-                left_diagonal_result[index_list_l][0].right_up = player
-                new_state.new_gain(player_name)
-
-        # left diagonals in line_copy
-        line_copy_result = ([[left_diagonal_result[0][0].right_up,
-                            left_diagonal_result[1][0].right_up]]
-                            + line_copy_result)
-        for i in range(1, len(line_copy_result) - 2):
-            line_copy_result[i].append(left_diagonal_result[i + 1][0].right_up)
-
-        # change in right diagonal
-        right_diagonal_result = copy.deepcopy(self.right_diagonal)
-        index_node_r = 0
-        index_list_r = 0
-        gain_r = 0
-        for diagonal_r in right_diagonal_result:
-            for item_r in diagonal_r:
-                if item_r.value == move:
-                    index_node_r = diagonal_r.index(item_r)
-                    index_list_r = right_diagonal_result.index(diagonal_r)
-        right_diagonal_result[index_list_r][index_node_r].value = player
-        for i in right_diagonal_result[index_list_r]:
-            if i.value == player:
-                gain_r += 1
-        if gain_r / len(right_diagonal_result[index_list_r]) >= 0.5:
-            if right_diagonal_result[index_list_r][-1].right_down == '@':
-                right_diagonal_result[index_list_r][-1].right_down = player
-                new_state.new_gain(player_name)
-
-        # right diagonals in line_copy
-        n1 = len(right_diagonal_result)
-        line_copy_result[-1] += [right_diagonal_result[0][-1].right_down]
-        line_copy_result.append([right_diagonal_result[i][-1].right_down
-                                 for i in range(n1 - 1, 0, -1)])
-
-        # return a new state
-        new_state.lines = line_result
-        new_state.left_diagonal = left_diagonal_result
-        new_state.right_diagonal = right_diagonal_result
-        new_state.lines_copy = line_copy_result
-        return new_state
+        # claim the leylines through cell the player now holds half of,
+        # copying the markers only if one is claimed
+        leylines = self.leylines
+        claimed = None
+        for line in topology.cell_leylines[cell]:
+            if (leylines[line] == '@'
+                    and 2 * bin(owned & topology.masks[line]).count('1')
+                    >= len(topology.leylines[line])):
+                if claimed is None:
+                    claimed = list(leylines)
+                claimed[line] = player
+                self.zobrist ^= topology.line_keys[player][line]
+                self.new_gain(player_name)
+        if claimed is not None:
+            self.leylines = tuple(claimed)
 
     def __repr__(self) -> str:
         """
@@ -435,12 +952,18 @@ class StonehengeState(GameState):
                                                p1_points, p2_points,
                                                unclaimed_number)
 
-    def rough_outcome(self) -> float:
+    def rough_outcome(self, two_ply: bool = False) -> float:
         """
         Return an estimate in interval [LOSE, WIN] of best outcome the current
         player can guarantee from state self.
         Override GameState.rough_outcome(self)
 
+        The estimate weighs the leylines each player holds against how many
+        more cells each player needs to claim every other leyline, in time
+        proportional to the number of leylines; it is WIN when one move
+        claims enough leylines to win. If two_ply, the moves of both players
+        are tried instead.
+
         >>> state = StonehengeState(True, 1)
         >>> state.rough_outcome()
         1.0
@@ -451,6 +974,143 @@ class StonehengeState(GameState):
         >>> state_5 = state_4.make_move('G')
         >>> state_5.rough_outcome()
         1.0
+        >>> round(state_2.rough_outcome(), 3), state_2.rough_outcome(True)
+        (-0.259, -1.0)
+        """
+        if self.over:
+            if self.whos_winner(self.get_current_player_name()):
+                return self.WIN
+            return self.LOSE
+        if two_ply:
+            return self._two_ply_outcome()
+
+        topology = self.topology
+        if self.p1_turn:
+            mine, theirs = self.p1_cells, self.p2_cells
+            margin = self.p1_count - self.p2_count
+            to_win = (topology.total_leylines + 1) // 2 - self.p1_count
+        else:
+            mine, theirs = self.p2_cells, self.p1_cells
+            margin = self.p2_count - self.p1_count
+            to_win = (topology.total_leylines + 1) // 2 - self.p2_count
+        free = ~(mine | theirs) & ((1 << len(topology.labels)) - 1)
+
+        # the free cells lying on at least one, two and three leylines that
+        # claiming them would win for the player to move
+        one = two = three = 0
+        for line, mark in enumerate(self.leylines):
+            if mark == '@':
+                mask = topology.masks[line]
+                need = (len(topology.leylines[line]) + 1) // 2
+                mine_need = need - bin(mine & mask).count('1')
+                theirs_need = need - bin(theirs & mask).count('1')
+                if mine_need == 1:
+                    open_cells = mask & free
+                    three |= two & open_cells
+                    two |= one & open_cells
+                    one |= open_cells
+                margin += (theirs_need - mine_need) / (theirs_need
+                                                       + mine_need)
+        if to_win <= 3 and (one, two, three)[to_win - 1]:
+            return float(self.WIN)
+        return margin / topology.total_leylines
+
+    def child_outcomes(self, moves: list) -> Any:
+        """
+        Return the rough_outcome of the state after each of moves, a cell
+        label or index, for the player about to move there. With NumPy
+        installed a numpy array is returned, and at least BATCH_MIN_MOVES
+        children are scored at once from the leylines' incidence matrix,
+        without being made; otherwise a list is returned.
+        Override GameState.child_outcomes(self)
+
+        >>> state = StonehengeState(True, 3).make_move('A').make_move('E')
+        >>> moves = state.get_possible_moves()
+        >>> scores = state.child_outcomes(moves)
+        >>> [round(float(score), 3) for score in scores[:5]]
+        [-0.111, -0.167, -0.167, -0.222, -0.139]
+        >>> [state.make_move(move).rough_outcome() for move in moves] == [
+        ...     float(score) for score in state.child_outcomes(moves)]
+        True
+        """
+        if not self.batches_child_outcomes(moves):
+            outcomes = GameState.child_outcomes(self, moves)
+            return outcomes if np is None else np.array(outcomes,
+                                                        dtype=float)
+        topology = self.topology
+        incidence = topology.incidence
+        total = topology.total_leylines
+        cells = [move if isinstance(move, int) else topology.index[move]
+                 for move in moves]
+        if self.p1_turn:
+            mover, other = self.p1_cells, self.p2_cells
+            mover_count, other_count = self.p1_count, self.p2_count
+        else:
+            mover, other = self.p2_cells, self.p1_cells
+            mover_count, other_count = self.p2_count, self.p1_count
+        sizes = incidence.sum(axis=1)
+        needs = (sizes + 1) // 2
+        unclaimed = np.array([mark == '@' for mark in self.leylines])
+
+        # a row for every leyline and a column for every child: the mover's
+        # cells on it, whether the move claims it, and whether it is still
+        # unclaimed afterwards
+        held = (incidence @ _cell_vector(mover, len(topology.labels)))[
+            :, None] + incidence[:, cells]
+        claimed = unclaimed[:, None] & (2 * held >= sizes[:, None])
+        still_open = unclaimed[:, None] & ~claimed
+        mover_counts = mover_count + claimed.sum(axis=0)
+        over = ((self.empty_cells == 1) | (2 * mover_counts >= total))
+
+        # the margin of the other player, who moves next, added up leyline
+        # by leyline in the same order as rough_outcome
+        other_need = (needs - incidence @ _cell_vector(
+            other, len(topology.labels)))[:, None]
+        mover_need = needs[:, None] - held
+        fractions = np.where(
+            still_open, (mover_need - other_need)
+            / np.where(still_open, mover_need + other_need, 1), 0.0)
+        margin = np.add.accumulate(np.vstack([other_count - mover_counts,
+                                              fractions]))[-1]
+
+        # whether a free cell lies on as many leylines the other player is
+        # one cell short of as it needs to win
+        to_win = (total + 1) // 2 - other_count
+        wins = np.zeros(len(cells), dtype=bool)
+        if to_win <= 3:
+            free = np.repeat((1 - _cell_vector(mover | other, len(
+                topology.labels)))[:, None], len(cells), axis=1)
+            free[cells, np.arange(len(cells))] = 0
+            short = incidence.T @ (still_open & (other_need == 1))
+            wins = ((short >= to_win) & (free == 1)).any(axis=0)
+
+        over_score = self.WIN if 2 * other_count >= total else self.LOSE
+        return np.where(over, float(over_score),
+                        np.where(wins, float(self.WIN), margin / total))
+
+    def batches_child_outcomes(self, moves: list) -> bool:
+        """
+        Return whether child_outcomes scores the states after moves without
+        making them.
+        Override GameState.batches_child_outcomes(self)
+
+        >>> state = StonehengeState(True, 3)
+        >>> state.batches_child_outcomes(['A'])
+        False
+        >>> state.batches_child_outcomes(state.get_possible_moves()) == (
+        ...     np is not None)
+        True
+        """
+        return np is not None and len(moves) >= BATCH_MIN_MOVES
+
+    # helper function to look one move of each player ahead
+    def _two_ply_outcome(self) -> float:
+        """
+        Return the rough_outcome of this state, which is not over, found by
+        trying every move and every reply to it.
+
+        >>> StonehengeState(True, 2).make_move('A')._two_ply_outcome()
+        -1.0
         """
         moves = self.get_possible_moves()
         player_playing = self.get_current_player_name()
@@ -458,34 +1118,30 @@ class StonehengeState(GameState):
             other_player = 'p2'
         else:
             other_player = 'p1'
-        if self.game_over():
-            if self.whos_winner(player_playing):
-                return self.WIN
-            else:
-                return self.LOSE
-        else:
-            result = []
-            for single_move in moves:
-                state_new = self.make_move(single_move)
-                if state_new.game_over():
-                    if state_new.whos_winner(player_playing):
-                        result.append(self.WIN)
-                    elif state_new.whos_winner(other_player):
-                        result.append(self.LOSE)
-                    else:
-                        result.append(self.DRAW)
+        result = []
+        for single_move in moves:
+            state_new = self.make_move(single_move)
+            if state_new.game_over():
+                if state_new.whos_winner(player_playing):
+                    result.append(self.WIN)
+                elif state_new.whos_winner(other_player):
+                    result.append(self.LOSE)
                 else:
-                    moves_1 = state_new.get_possible_moves()
-                    for single_move_1 in moves_1:
-                        state_new_1 = state_new.make_move(single_move_1)
-                        if state_new_1.game_over():
-                            if state_new.whos_winner(player_playing):
-                                result.append(self.WIN)
-                            elif state_new.whos_winner(other_player):
-                                result.append(self.LOSE)
-                            else:
-                                result.append(self.DRAW)
-            return sum(result)/(len(result))
+                    result.append(self.DRAW)
+            else:
+                moves_1 = state_new.get_possible_moves()
+                for single_move_1 in moves_1:
+                    state_new_1 = state_new.make_move(single_move_1)
+                    if state_new_1.game_over():
+                        if state_new_1.whos_winner(player_playing):
+                            result.append(self.WIN)
+                        elif state_new_1.whos_winner(other_player):
+                            result.append(self.LOSE)
+                        else:
+                            result.append(self.DRAW)
+        if result == []:
+            return self.DRAW
+        return sum(result)/(len(result))
 
     # helper function to check if the game is over in current game state
     def game_over(self) -> bool:
@@ -499,12 +1155,7 @@ class StonehengeState(GameState):
         >>> state_1.game_over()
         True
         """
-        if (self.p1_count / self.total_leylines >= 0.5
-                or self.p2_count / self.total_leylines >= 0.5
-                or self.get_possible_moves() == []):
-            return True
-        else:
-            return False
+        return self.over
 
     # helper function to find winner if game is over
     def whos_winner(self, name: str) -> bool or str:
@@ -516,11 +1167,83 @@ class StonehengeState(GameState):
         >>> state_1.whos_winner('p1')
         True
         """
-        if self.game_over():
+        if self.over:
             if name == 'p1':
-                return self.p1_count / self.total_leylines >= 0.5
+                return 2 * self.p1_count >= self.topology.total_leylines
             else:
-                return self.p2_count / self.total_leylines >= 0.5
+                return 2 * self.p2_count >= self.topology.total_leylines
+
+
+def _cell_vector(cells: int, size: int) -> Any:
+    """
+    Return a numpy array of size 0s and 1s, 1 for every cell in the bitmask
+    cells.
+    """
+    data = np.frombuffer(cells.to_bytes(size // 8 + 1, 'little'),
+                         dtype=np.uint8)
+    return np.unpackbits(data, bitorder='little')[:size].astype(np.int64)
+
+
+def state_from_bytes(data: bytes) -> StonehengeState:
+    """
+    Return the StonehengeState serialised as data by
+    StonehengeState.to_bytes.
+
+    >>> state = StonehengeState(False, 2).make_move('D').make_move('A')
+    >>> copy = state_from_bytes(state.to_bytes())
+    >>> copy.lines_copy == state.lines_copy, hash(copy) == hash(state)
+    (True, True)
+    """
+    length = data[0]
+    topology = board_topology(length)
+    cell_bytes = (len(topology.labels) + 7) // 8
+    line_bytes = (topology.total_leylines + 7) // 8
+    masks = []
+    start = 2
+    for size in (cell_bytes, cell_bytes, line_bytes, line_bytes):
+        masks.append(int.from_bytes(data[start:start + size], 'little'))
+        start += size
+    leylines = ['1' if masks[2] >> i & 1 else '2' if masks[3] >> i & 1
+                else '@' for i in range(topology.total_leylines)]
+    return _state_from_fields(bool(data[1]), length, masks[0], masks[1],
+                              tuple(leylines))
+
+
+# helper function to build a state from its cells and leylines
+def _state_from_fields(is_p1_turn: bool, length: int, p1_cells: int,
+                       p2_cells: int, leylines: Sequence[str]
+                       ) -> StonehengeState:
+    """
+    Return the StonehengeState with the given fields, counting its claimed
+    leylines and empty cells, and computing its Zobrist hash and whether
+    the game is over.
+
+    >>> state = _state_from_fields(False, 1, 1, 0, ['1', '@', '1', '@', '@',
+    ...                                             '1'])
+    >>> state == StonehengeState(True, 1).make_move('A')
+    True
+    """
+    state = StonehengeState(is_p1_turn, length)
+    cell_keys = state.topology.cell_keys
+    line_keys = state.topology.line_keys
+    state.p1_cells = p1_cells
+    state.p2_cells = p2_cells
+    state.leylines = tuple(leylines)
+    state.p1_count = leylines.count('1')
+    state.p2_count = leylines.count('2')
+    state.empty_cells -= bin(p1_cells | p2_cells).count('1')
+    state.over = (state.empty_cells == 0
+                  or 2 * max(state.p1_count, state.p2_count)
+                  >= state.topology.total_leylines)
+    for i in range(len(cell_keys['1'])):
+        if p1_cells >> i & 1:
+            state.zobrist ^= cell_keys['1'][i]
+        elif p2_cells >> i & 1:
+            state.zobrist ^= cell_keys['2'][i]
+    for i, mark in enumerate(leylines):
+        if mark != '@':
+            state.zobrist ^= line_keys[mark][i]
+    return state
 
 
 if __name__ == "__main__":
@@ -5,9 +5,158 @@ NOTE: Make sure this file adheres to python-ta.
 Adjust the type annotations as needed, and implement both a recursive
 and an iterative version of minimax.
 """
+import atexit
+import functools
+import json
+import math
+import multiprocessing
+import os
+import random
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from game import Game
-from typing import Any, List
+from typing import Any, Callable, Dict, Hashable, Iterator, List, \
+    Optional, TextIO, Tuple, Union
 from game_state import GameState
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# the number of processes parallel_minimax_strategy searches with
+PARALLEL_WORKERS = os.cpu_count() or 1
+# states with fewer moves than this are searched in this process instead
+PARALLEL_MIN_MOVES = 6
+# the seconds iterative_deepening_strategy may spend choosing a move
+TIME_BUDGET = 1.0
+# minimax_iterative_strategy stores the scores of states fewer moves than
+# this below the current state in transposition_table, and no others, which
+# bounds its memory at the cost of searching deeper transpositions again
+ITERATIVE_TABLE_PLIES = 6
+# the iterations mcts_strategy runs for each move, or None for no limit
+MCTS_ITERATIONS = 2000
+# the seconds mcts_strategy may spend choosing a move, or None for no limit
+MCTS_TIME_BUDGET = None
+# how strongly mcts_strategy tries moves it has visited less
+MCTS_EXPLORATION = 1.4
+# the random games mcts_strategy plays from every new state
+MCTS_ROLLOUTS = 1
+# the new states mcts_strategy adds before playing out all of their random
+# games at once, shared out over PARALLEL_WORKERS processes; with 1 every
+# state's games are played in this process as soon as it is added
+MCTS_LEAF_BATCH = 1
+
+
+class SearchCollector:
+    """
+    A collector of the profile of every move chosen by an instrumented
+    strategy inside a with block, each written as a line of JSON.
+
+    A profile holds the strategy, the player it moved for, the move, the
+    seconds it took, the counters of last_search_stats and the
+    transposition_table hits and misses of the search.
+
+    records - the profiles collected, oldest first
+    """
+    records: List[Dict[str, Any]]
+
+    def __init__(self, out: Union[str, TextIO] = None) -> None:
+        """
+        Create SearchCollector self writing its profiles to the file named
+        or given by out, or only keeping them in records if out is None.
+        """
+        self.records = []
+        self._out = out
+        self._file = None
+        self._previous = None
+        self._busy = False
+
+    def __enter__(self) -> "SearchCollector":
+        """
+        Start collecting the moves of instrumented strategies.
+        """
+        global _collector
+        if isinstance(self._out, str):
+            self._file = open(self._out, 'a')
+        else:
+            self._file = self._out
+        self._previous = _collector
+        _collector = self
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """
+        Stop collecting, going back to the collector active before.
+        """
+        global _collector
+        _collector = self._previous
+        if isinstance(self._out, str):
+            self._file.close()
+        self._file = None
+
+    def record(self, profile: Dict[str, Any]) -> None:
+        """
+        Keep profile, and write it as a line of JSON if SearchCollector self
+        has somewhere to write to.
+        """
+        self.records.append(profile)
+        if self._file is not None:
+            self._file.write(json.dumps(profile, default=str) + '\n')
+
+
+# the SearchCollector of the with block being run, or None
+_collector = None
+
+
+def instrumented(strategy: Callable[[Game], Any]) -> Callable[[Game], Any]:
+    """
+    Return strategy, reporting the profile of every move it chooses to the
+    active SearchCollector. Without one, only a check is added to each move.
+    A strategy called by another instrumented strategy is profiled as part
+    of it.
+
+    >>> from subtract_square_game import SubtractSquareGame
+    >>> with SearchCollector() as collector:
+    ...     move = alpha_beta_strategy(SubtractSquareGame(True, 10))
+    >>> profile = collector.records[0]
+    >>> profile['strategy'], profile['move'], profile['nodes'] > 0
+    ('alpha_beta_strategy', 1, True)
+    >>> with SearchCollector() as collector:
+    ...     for strategy_ in (minimax_recursive_strategy,
+    ...                       minimax_iterative_strategy,
+    ...                       rough_outcome_strategy):
+    ...         move = strategy_(SubtractSquareGame(True, 10))
+    >>> [profile['nodes'] > 0 for profile in collector.records]
+    [True, True, True]
+    """
+    @functools.wraps(strategy)
+    def profiled(game: Game) -> Any:
+        """
+        Return the move of strategy for game, profiling it if collecting.
+        """
+        collector = _collector
+        if collector is None or collector._busy:
+            return strategy(game)
+        table = transposition_table
+        hits, misses = table.hits, table.misses
+        player = game.current_state.get_current_player_name()
+        last_search_stats.reset()
+        collector._busy = True
+        start = time.perf_counter()
+        try:
+            move = strategy(game)
+        finally:
+            collector._busy = False
+        profile = {'strategy': strategy.__name__, 'player': player,
+                   'move': move, 'seconds': time.perf_counter() - start}
+        profile.update(vars(last_search_stats))
+        profile['cache_hits'] = table.hits - hits
+        profile['cache_misses'] = table.misses - misses
+        collector.record(profile)
+        return move
+    return profiled
+
 
 # TODO: Adjust the type annotation as needed.
 def interactive_strategy(game: Game) -> Any:
@@ -17,6 +166,7 @@ def interactive_strategy(game: Game) -> Any:
     move = input("Enter a move: ")
     return game.str_to_move(move)
 
+@instrumented
 def rough_outcome_strategy(game: Any) -> Any:
     """
     Return a move for game by picking a move which results in a state with
@@ -38,101 +188,735 @@ def rough_outcome_strategy(game: Any) -> Any:
         random, but worse than minimax.
     """
     current_state = game.current_state
-    best_move = None
-    best_outcome = -2 # Temporarily -- just so we can replace this easily later
-
-    # Get the move that results in the lowest rough_outcome for the opponent
-    for move in current_state.get_possible_moves():
-        new_state = current_state.make_move(move)
+    moves = current_state.get_possible_moves()
+    if not moves:
+        return None
 
-        # We multiply the below by -1 since a state that's bad for the opponent
-        # is good for us.
-        guessed_score = new_state.rough_outcome() * -1
-        if guessed_score > best_outcome:
-            best_outcome = guessed_score
-            best_move = move
+    # Score every move's state at once, for the opponent who moves there
+    outcomes = current_state.child_outcomes(moves)
+    last_search_stats.nodes += len(moves)
+    if not current_state.batches_child_outcomes(moves):
+        last_search_stats.moves_made += len(moves)
 
-    # Return the move that resulted in the best rough_outcome
-    return best_move
+    # Return the first move that results in the lowest rough_outcome for the
+    # opponent, since a state that's bad for the opponent is good for us.
+    if np is None:
+        return moves[min(range(len(moves)), key=outcomes.__getitem__)]
+    return moves[int(np.argmin(outcomes))]
 
 # TODO: Implement a recursive version of the minimax strategy.
 
 
+@instrumented
 def minimax_recursive_strategy(game: Game) -> Any:
     """
     Return a move for game by running a minimax recursive strategy.
+
+    Scores are cached in transposition_table, so positions reached through
+    different move orders are only expanded once.
+    """
+    state = game.current_state
+    best_move = None
+    best_score = state.LOSE - 1
+    for move in root_moves(state):
+        score = -cal_scores(game, state.make_move(move))
+        last_search_stats.moves_made += 1
+        if score > best_score:
+            best_move, best_score = move, score
+            if best_score >= state.WIN:
+                break
+    return best_move
+
+
+def cal_scores(game: Game, game_state: GameState, ply: int = 1) -> int:
+    """
+    Return the score of game_state for the player about to move, assuming
+    both players play their best moves from there on. game_state is ply
+    moves below game.current_state.
+
+    game.current_state is left untouched, and the moves of game_state stop
+    being searched as soon as one of them is found to win.
+    """
+    last_search_stats.nodes += 1
+    entry = transposition_table.lookup(game_state)
+    if entry is not None and entry.solved():
+        _reached(ply)
+        return entry.score
+    score = terminal_score(game, game_state)
+    if score is None:
+        score = game_state.LOSE
+        tried = 0
+        for tried, move in enumerate(game_state.get_possible_moves(), 1):
+            score = max(score, -cal_scores(game, game_state.make_move(move),
+                                           ply + 1))
+            if score >= game_state.WIN:
+                break
+        last_search_stats.moves_made += tried
+        transposition_table.store(game_state, TableEntry(score))
+    else:
+        _reached(ply)
+    return score
+
+
+def root_moves(state: GameState) -> list:
+    """
+    Return the moves a search tries from state, the current state of its
+    game: those kept by root_move_filter, or all of them.
+
+    >>> from subtract_square_state import SubtractSquareState
+    >>> root_moves(SubtractSquareState(True, 5))
+    [1, 4]
+    """
+    if root_move_filter is None:
+        return state.get_possible_moves()
+    return root_move_filter(state)
+
+
+def terminal_score(game: Game, state: GameState) -> Optional[int]:
+    """
+    Return the score of state for the player about to move if game is over
+    at state, or None if it is not.
+
+    Without changing game.current_state: like Game.is_winner, the player who
+    made the last move is the winner of a finished game.
+    """
+    last_search_stats.terminal_checks += 1
+    if game.is_over(state):
+        return state.LOSE
+    return None
+
+
+def _reached(ply: int) -> None:
+    """
+    Record in last_search_stats that a search stopped ply moves below the
+    current state. Searches only call this where they stop going deeper,
+    which is where they reach their greatest depth.
+    """
+    if ply > last_search_stats.max_depth:
+        last_search_stats.max_depth = ply
+
+
+@instrumented
+def alpha_beta_strategy(game: Game) -> Any:
+    """
+    Return a move for game by running minimax with alpha-beta pruning.
+
+    The moves of the current state are tried in order, so the move returned
+    is the same as full minimax's. Deeper moves are ordered by the best move
+    in transposition_table, then by how often they caused a cutoff, so that
+    strong moves prune their siblings early. The number of states visited
+    and cutoffs made are left in last_search_stats.
+    """
+    last_search_stats.reset()
+    history = {}
+    state = game.current_state
+    best_move = None
+    best_score = state.LOSE - 1
+    for move in root_moves(state):
+        score = -_alpha_beta(game, state.make_move(move), -state.WIN,
+                             -best_score, history)
+        last_search_stats.moves_made += 1
+        if score > best_score:
+            best_move, best_score = move, score
+            if best_score >= state.WIN:
+                last_search_stats.cutoffs += 1
+                break
+    return best_move
+
+
+def _alpha_beta(game: Game, state: GameState, alpha: float, beta: float,
+                history: dict, stop: Callable[[], bool] = None,
+                depth: float = float('inf'), ply: int = 1) -> float:
+    """
+    Return the score of state, ply moves below game.current_state, for the
+    player about to move, searching its moves inside the window (alpha,
+    beta). A score at or below alpha is an upper bound and a score at or
+    above beta a lower bound on the real one.
+
+    If stop is given, it is called every 16 states, and the search
+    raises SearchAborted once it returns True. States depth moves below
+    state are scored by their rough_outcome instead of being searched.
+    A score that no such estimate went into is stored in
+    transposition_table as searched to any depth.
+    """
+    last_search_stats.nodes += 1
+    if stop is not None and last_search_stats.nodes % 16 == 0 and stop():
+        raise SearchAborted
+    score = terminal_score(game, state)
+    if score is not None:
+        _reached(ply)
+        return score
+    if depth <= 0:
+        _reached(ply)
+        last_search_stats.estimated += 1
+        return state.rough_outcome()
+
+    entry = transposition_table.lookup(state)
+    first_move = None
+    estimated = last_search_stats.estimated
+    if entry is not None and entry.depth >= depth:
+        if entry.depth != float('inf'):
+            # the entry's score rests on estimates of a search limited by
+            # depth
+            last_search_stats.estimated += 1
+        if entry.flag == TableEntry.EXACT:
+            _reached(ply)
+            return entry.score
+        elif entry.flag == TableEntry.LOWER:
+            alpha = max(alpha, entry.score)
+        else:
+            beta = min(beta, entry.score)
+        if alpha >= beta:
+            _reached(ply)
+            return entry.score
+        first_move = entry.move
+
+    moves = sorted(state.get_possible_moves(),
+                   key=lambda m: (m != first_move, -history.get(m, 0)))
+    alpha_now = alpha
+    best_move = None
+    best_score = state.LOSE - 1
+    tried = 0
+    for tried, move in enumerate(moves, 1):
+        score = -_alpha_beta(game, state.make_move(move), -beta, -alpha_now,
+                             history, stop, depth - 1, ply + 1)
+        if score > best_score:
+            best_move, best_score = move, score
+            alpha_now = max(alpha_now, score)
+            if alpha_now >= beta:
+                history[move] = history.get(move, 0) + 1
+                last_search_stats.cutoffs += 1
+                break
+    last_search_stats.moves_made += tried
+
+    if best_score <= alpha:
+        flag = TableEntry.UPPER
+    elif best_score >= beta:
+        flag = TableEntry.LOWER
+    else:
+        flag = TableEntry.EXACT
+    if last_search_stats.estimated == estimated:
+        depth = float('inf')
+    transposition_table.store(state, TableEntry(best_score, depth, flag,
+                                                best_move))
+    return best_score
+
+
+@instrumented
+def iterative_deepening_strategy(game: Game) -> Any:
+    """
+    Return a move for game by searching one move deeper at a time, until
+    TIME_BUDGET seconds have passed or the game has been searched to its end.
+
+    States below the depth being searched are scored by rough_outcome. The
+    move returned is the best of the deepest search that finished; each
+    search tries the best move of the one before it first.
+
+    Scores left in transposition_table by the search of an earlier move do
+    not stop it deepening unless they are proven.
+
+    >>> import strategy
+    >>> from stonehenge_game import StonehengeGame
+    >>> budget, strategy.TIME_BUDGET = strategy.TIME_BUDGET, 0.2
+    >>> game = StonehengeGame(True, 4)
+    >>> transposition_table.clear()
+    >>> move = iterative_deepening_strategy(game)
+    >>> game.current_state = game.current_state.make_move(move)
+    >>> move = iterative_deepening_strategy(game)
+    >>> last_search_stats.max_depth > 2
+    True
+    >>> strategy.TIME_BUDGET = budget
+    """
+    deadline = time.perf_counter() + TIME_BUDGET
+    last_search_stats.reset()
+    state = game.current_state
+    moves = list(root_moves(state))
+    history = {}
+    best_move = None
+    depth = 1
+    while True:
+        estimated = last_search_stats.estimated
+        if best_move is not None:
+            moves.remove(best_move)
+            moves.insert(0, best_move)
+        try:
+            move, score = _search_root(game, moves, depth, history,
+                                       _deadline_stop(deadline)
+                                       if best_move is not None else None)
+        except SearchAborted:
+            break
+        best_move = move
+        if (abs(score) >= state.WIN
+                or last_search_stats.estimated == estimated):
+            # the result is proven, or no state was cut off by depth
+            break
+        depth += 1
+    return best_move
+
+
+def _search_root(game: Game, moves: list, depth: float, history: dict,
+                 stop: Callable[[], bool] = None) -> Tuple[Any, float]:
+    """
+    Return the best of moves from game's current state and its score,
+    searching depth moves deep. The first of the best moves is returned.
+    """
+    state = game.current_state
+    best_move = None
+    best_score = state.LOSE - 1
+    for move in moves:
+        score = -_alpha_beta(game, state.make_move(move), -state.WIN,
+                             -best_score, history, stop, depth - 1)
+        last_search_stats.moves_made += 1
+        if score > best_score:
+            best_move, best_score = move, score
+            if best_score >= state.WIN:
+                break
+    return best_move, best_score
+
+
+def _deadline_stop(deadline: float) -> Callable[[], bool]:
+    """
+    Return a function that returns whether the time.perf_counter() deadline
+    has passed.
+    """
+    return lambda: time.perf_counter() >= deadline
+
+
+@instrumented
+def parallel_minimax_strategy(game: Game) -> Any:
+    """
+    Return the move alpha_beta_strategy would for game, scoring each move of
+    the current state in its own worker process.
+
+    The workers share the best (score, move) found so far: a worker only
+    needs to find out whether its move beats it, and gives up once an
+    earlier move is known to win. States with few moves are searched in
+    this process, where starting workers would cost more than it saves, and
+    so is every state when this process is itself a worker.
+    """
+    moves = root_moves(game.current_state)
+    if len(moves) < PARALLEL_MIN_MOVES or not _can_parallelise():
+        return alpha_beta_strategy(game)
+
+    last_search_stats.reset()
+    pool = _get_root_pool()
+    _root_best.value = _encode_root_best(game.current_state.LOSE - 1,
+                                         len(moves))
+    best_move = None
+    best = None
+    jobs = [(game, i, move) for i, move in enumerate(moves)]
+    for i, score, stats in pool.map(_score_root_move, jobs):
+        last_search_stats.merge(stats)
+        if score is not None and (best is None or score > best):
+            best_move, best = moves[i], score
+    return best_move
+
+
+class SearchAborted(Exception):
+    """
+    Raised to abandon a search that is no longer needed.
+    """
+
+
+# the process pool of parallel_minimax_strategy, started when first needed
+_root_pool = None
+# the best root move found so far by the workers of _root_pool, encoded by
+# _encode_root_best
+_root_best = None
+
+# the most root moves _encode_root_best tells apart
+_MAX_ROOT_MOVES = 1000000
+
+
+def _encode_root_best(score: int, index: int) -> int:
+    """
+    Return score and index of a root move as one integer, larger for a
+    higher score and then for an earlier move.
+
+    >>> _encode_root_best(1, 0) > _encode_root_best(1, 3)
+    True
+    >>> _encode_root_best(0, 0) < _encode_root_best(1, 3)
+    True
+    """
+    return (score + 2) * _MAX_ROOT_MOVES + _MAX_ROOT_MOVES - 1 - index
+
+
+def _decode_root_best(code: int) -> Tuple[int, int]:
+    """
+    Return the score and index of the root move encoded as code by
+    _encode_root_best.
+
+    >>> _decode_root_best(_encode_root_best(-1, 7))
+    (-1, 7)
+    """
+    score, index = divmod(code, _MAX_ROOT_MOVES)
+    return score - 2, _MAX_ROOT_MOVES - 1 - index
+
+
+def _can_parallelise() -> bool:
     """
-    moves_to_make = game.current_state.get_possible_moves()
-    result = [cal_scores(game, game.current_state.make_move(move)) for move in
-              moves_to_make]
-    return moves_to_make[result.index(max(result))]
+    Return whether searches may start worker processes: there is more than
+    one worker to start, and this process is not a worker of another pool,
+    which could not exit while its own workers are left running.
+    """
+    return PARALLEL_WORKERS > 1 and multiprocessing.parent_process() is None
+
+
+def _get_root_pool() -> ProcessPoolExecutor:
+    """
+    Return the process pool of parallel_minimax_strategy, starting it and
+    the value its workers share if needed. The pool is shut down when this
+    process exits.
+    """
+    global _root_pool, _root_best
+    if _root_pool is None:
+        _root_best = multiprocessing.Value('q', 0)
+        _root_pool = ProcessPoolExecutor(PARALLEL_WORKERS,
+                                         initializer=_init_root_worker,
+                                         initargs=(_root_best,))
+        atexit.register(_shutdown_root_pool)
+    return _root_pool
+
+
+def _shutdown_root_pool() -> None:
+    """
+    Shut down the process pool of parallel_minimax_strategy, if started.
+    """
+    global _root_pool
+    if _root_pool is not None:
+        _root_pool.shutdown()
+        _root_pool = None
+
+
+def _init_root_worker(root_best: Any) -> None:
+    """
+    Keep root_best, the value shared by the workers of _root_pool, in this
+    worker process.
+    """
+    global _root_best
+    _root_best = root_best
 
 
-def cal_scores(game: Game, game_state: GameState) -> int:
+def _score_root_move(job: Tuple[Game, int, Any]
+                     ) -> Tuple[int, Optional[float], "SearchStats"]:
     """
-    Calculate scores gained by players for possible moves in the game.
+    Score the move numbered index of game's current state, where job is
+    (game, index, move). Return index, the score of the move or None if it
+    cannot beat the best move shared in _root_best, and the counters of the
+    search.
     """
-    state_now = game.current_state
-    current_player = game.current_state.get_current_player_name()
-    if current_player == 'p1':
-        other_player = 'p2'
+    game, index, move = job
+    state = game.current_state
+    last_search_stats.reset()
+    best, best_index = _decode_root_best(_root_best.value)
+
+    def stop() -> bool:
+        """
+        Return whether an earlier move than this one is known to win.
+        """
+        score, earlier = _decode_root_best(_root_best.value)
+        return score >= state.WIN and earlier < index
+
+    if stop():
+        return index, None, last_search_stats
+
+    # an earlier move with the same score is still preferred to this one
+    alpha = best if best_index < index else best - 1
+    try:
+        last_search_stats.moves_made += 1
+        score = -_alpha_beta(game, state.make_move(move), -state.WIN,
+                             -alpha, {}, stop)
+    except SearchAborted:
+        score = None
+    if score is not None and score > alpha:
+        with _root_best.get_lock():
+            code = _encode_root_best(score, index)
+            if code > _root_best.value:
+                _root_best.value = code
     else:
-        other_player = 'p1'
-    if game.is_over(game_state):
-        game.current_state = game_state
-        if game.is_winner(current_player):
-            game.current_state = state_now
-            return game.current_state.WIN
-        elif game.is_winner(other_player):
-            game.current_state = state_now
-            return game.current_state.LOSE
-        game.current_state = state_now
-        return game.current_state.DRAW
-    a = [cal_scores(game, game_state.make_move(move)) for move in
-         game_state.get_possible_moves()]
-    return sum([score for score in a])
+        score = None
+    return index, score, last_search_stats
+
+
+@instrumented
+def mcts_strategy(game: Game) -> Any:
+    """
+    Return a move for game by Monte Carlo tree search with UCT.
+
+    Every iteration walks down the tree of searched states, choosing moves by
+    the UCT formula, adds one new state, plays MCTS_ROLLOUTS random games on
+    from it and adds their results to the states on its path. With
+    MCTS_LEAF_BATCH above 1, that many iterations add their states first,
+    and the random games of all of them are played in worker processes
+    together. The search stops after MCTS_ITERATIONS iterations or
+    MCTS_TIME_BUDGET seconds, whichever comes first, and plays the move
+    visited most. The tree below that move is kept, so the next move reuses
+    the iterations spent on the opponent's reply.
+
+    >>> from subtract_square_game import SubtractSquareGame
+    >>> mcts_strategy(SubtractSquareGame(True, 4))
+    4
+    """
+    global _mcts_root
+    last_search_stats.reset()
+    root = _reuse_mcts_tree(game)
+    deadline = None
+    if MCTS_TIME_BUDGET is not None:
+        deadline = time.perf_counter() + MCTS_TIME_BUDGET
+    batch = MCTS_LEAF_BATCH if _can_parallelise() else 1
+    iterations = 0
+    while (iterations == 0
+           or ((MCTS_ITERATIONS is None or iterations < MCTS_ITERATIONS)
+               and (deadline is None or time.perf_counter() < deadline))):
+        if batch > 1:
+            size = batch
+            if MCTS_ITERATIONS is not None:
+                size = min(size, MCTS_ITERATIONS - iterations)
+            _mcts_batch(game, root, max(size, 1))
+            iterations += max(size, 1)
+        else:
+            _mcts_iteration(game, root)
+            iterations += 1
+    best = max(root.children, key=lambda child: child.visits)
+    _mcts_root = best
+    return best.move
+
+
+# the node of the move mcts_strategy played last, kept for its next search
+_mcts_root = None
+
+
+def _reuse_mcts_tree(game: Game) -> "MCTSNode":
+    """
+    Return the node of game's current state kept from the last search of
+    mcts_strategy, cut off from the rest of its tree, or a new node if the
+    state was not searched.
+    """
+    state = game.current_state
+    if _mcts_root is not None:
+        for node in [_mcts_root] + _mcts_root.children:
+            if node.state == state:
+                node.parent = None
+                return node
+    return MCTSNode(game, state)
+
+
+def _mcts_iteration(game: Game, root: "MCTSNode") -> None:
+    """
+    Run one iteration of mcts_strategy on the tree below root.
+    """
+    node = _mcts_select(game, root)
+    result = node.terminal
+    if result is None:
+        result = _rollouts(game, node.state)
+    _mcts_backup(node, result)
+
+
+def _mcts_batch(game: Game, root: "MCTSNode", size: int) -> None:
+    """
+    Run size iterations of mcts_strategy on the tree below root, playing the
+    random games of all their new states together in worker processes.
+
+    Every state chosen counts as visited until the results are in, so that
+    the iterations after it choose other states.
+    """
+    leaves = []
+    for _ in range(size):
+        node = _mcts_select(game, root)
+        _mcts_add_visits(node, 1)
+        leaves.append(node)
+    pending = [node for node in leaves if node.terminal is None]
+    results = iter(_parallel_rollouts(game, [node.state
+                                             for node in pending]))
+    for node in leaves:
+        _mcts_add_visits(node, -1)
+        result = node.terminal
+        if result is None:
+            result = next(results)
+        _mcts_backup(node, result)
+
+
+def _mcts_select(game: Game, root: "MCTSNode") -> "MCTSNode":
+    """
+    Return the node an iteration of mcts_strategy plays random games from:
+    walk down the tree below root by UCT and add one new child to it, if
+    there is a move left to try.
+    """
+    node = root
+    depth = 0
+    while not node.untried and node.children:
+        node = node.best_child(MCTS_EXPLORATION)
+        depth += 1
+    if node.untried:
+        move = node.untried.pop(random.randrange(len(node.untried)))
+        child = MCTSNode(game, node.state.make_move(move), move, node)
+        last_search_stats.moves_made += 1
+        node.children.append(child)
+        node = child
+        depth += 1
+        last_search_stats.nodes += 1
+    _reached(depth)
+    return node
+
+
+def _mcts_add_visits(node: "MCTSNode", visits: int) -> None:
+    """
+    Add visits to node and every node above it.
+    """
+    while node is not None:
+        node.visits += visits
+        node = node.parent
+
+
+def _mcts_backup(node: "MCTSNode", result: float) -> None:
+    """
+    Add one visit with result, for the player about to move at node, to
+    node and every node above it.
+    """
+    # the player who made node's move is the other one
+    while node is not None:
+        node.visits += 1
+        node.total -= result
+        result = -result
+        node = node.parent
+
+
+def _rollouts(game: Game, state: GameState) -> float:
+    """
+    Return the mean result of MCTS_ROLLOUTS random games played on from
+    state, for the player about to move at state.
+    """
+    if MCTS_ROLLOUTS <= 1:
+        return _rollout(game, state)
+    return sum(_rollout(game, state)
+               for _ in range(MCTS_ROLLOUTS)) / MCTS_ROLLOUTS
+
+
+def _parallel_rollouts(game: Game, states: List[GameState]) -> List[float]:
+    """
+    Return the result of _rollouts for each of states, shared out over the
+    PARALLEL_WORKERS processes of the root pool in one chunk of states each,
+    and add the counters of the workers to last_search_stats.
+    """
+    if not states:
+        return []
+    chunk = -(-len(states) // PARALLEL_WORKERS)
+    jobs = [(game, states[i:i + chunk], random.getrandbits(64))
+            for i in range(0, len(states), chunk)]
+    results = []
+    for chunk_results, stats in _get_root_pool().map(_rollout_job, jobs):
+        results.extend(chunk_results)
+        last_search_stats.merge(stats)
+    return results
+
+
+def _rollout(game: Game, state: GameState) -> float:
+    """
+    Return the result of a game played on from state with random moves, for
+    the player about to move at state. If its class implements
+    GameState.apply, the moves are applied to state in place and undone
+    before returning; otherwise new states are made.
+
+    >>> from subtract_square_game import SubtractSquareGame
+    >>> from subtract_square_state import SubtractSquareState
+    >>> game = SubtractSquareGame(True, 2)
+    >>> _rollout(game, SubtractSquareState(True, 2))
+    -1
+    >>> class MakeMoveOnly(SubtractSquareState):
+    ...     apply = GameState.apply
+    >>> _rollout(game, MakeMoveOnly(True, 2))
+    -1
+    """
+    in_place = type(state).apply is not GameState.apply
+    moves = 0
+    try:
+        score = terminal_score(game, state)
+        while score is None:
+            move = random.choice(state.get_possible_moves())
+            if in_place:
+                state.apply(move)
+            else:
+                state = state.make_move(move)
+            moves += 1
+            score = terminal_score(game, state)
+    finally:
+        if in_place:
+            # undo every move played on state itself
+            for _ in range(moves):
+                state.undo()
+    last_search_stats.moves_made += moves
+    return score if moves % 2 == 0 else -score
+
+
+def _rollout_job(job: Tuple[Game, List[GameState], int]
+                 ) -> Tuple[List[float], "SearchStats"]:
+    """
+    Return the result of _rollouts for each state of job, which is (game,
+    states, seed), with the random module seeded by seed, and the counters
+    of the random games.
+
+    >>> from subtract_square_game import SubtractSquareGame
+    >>> from subtract_square_state import SubtractSquareState
+    >>> game = SubtractSquareGame(True, 2)
+    >>> results, stats = _rollout_job((game, [SubtractSquareState(True, 2)],
+    ...                                0))
+    >>> results, stats.moves_made
+    ([-1], 2)
+    """
+    game, states, seed = job
+    random.seed(seed)
+    last_search_stats.reset()
+    return ([_rollouts(game, state) for state in states],
+            last_search_stats)
 
 
 # TODO: Implement an iterative version of the minimax strategy.
 
+@instrumented
 def minimax_iterative_strategy(game: Game) -> Any:
     """
     Return a move for game by using iterative minimax.
+
+    The search keeps a Stack of SearchFrame, one per state on the path it is
+    searching, so a state is dropped as soon as it is scored. Scores are
+    looked up in transposition_table, but only those of states fewer than
+    ITERATIVE_TABLE_PLIES moves below the current state are stored there,
+    so memory grows with the length of a game rather than the size of its
+    tree.
     """
-    state_now = game.current_state
-    root_node = TreeNode(state_now)
     s = Stack()
-    s.add(root_node)
+    s.add(SearchFrame(game.current_state, root_moves(game.current_state)))
+    last_search_stats.nodes += 1
+    score = None
     while not s.empty():
-        removed_node = s.remove()
-        state = removed_node.value
-        if game.is_over(state):
-            current_player = state.get_current_player_name()
-            if current_player == 'p1':
-                other_player = 'p2'
-            else:
-                other_player = 'p1'
+        frame = s.remove()
+        if score is not None:
+            # score is that of the state frame.move led to
+            if -score > frame.score:
+                frame.score, frame.best_move = -score, frame.move
+            score = None
+        frame.move = next(frame.moves, SearchFrame.DONE)
+        if frame.move is SearchFrame.DONE or frame.score >= frame.state.WIN:
+            score = frame.score
+            if s.size() < ITERATIVE_TABLE_PLIES:
+                transposition_table.store(
+                    frame.state, TableEntry(score, move=frame.best_move))
+            continue
 
-            game.current_state = state
-            if game.is_winner(current_player):
-                removed_node.score = GameState.WIN
-            elif game.is_winner(other_player):
-                removed_node.score = GameState.LOSE
-            else:
-                removed_node.score = GameState.DRAW
-            game.current_state = state_now
-        elif removed_node.children == []:
-            s.add(removed_node)
-            for move in state.get_possible_moves():
-                child_node = TreeNode(state.make_move(move))
-                removed_node.children.append(child_node)
-                s.add(child_node)
+        s.add(frame)
+        state = frame.state.make_move(frame.move)
+        last_search_stats.moves_made += 1
+        entry = transposition_table.lookup(state)
+        if entry is not None and entry.solved():
+            score = entry.score
         else:
-            removed_node.score = max([-1 * child.score for child in
-                                      removed_node.children])
-    moves = state_now.get_possible_moves()
-    child_scores = [child.score for child in root_node.children]
-    return moves[child_scores.index(root_node.score * -1)]
+            score = terminal_score(game, state)
+            if score is None:
+                s.add(SearchFrame(state))
+                last_search_stats.nodes += 1
+        if score is not None:
+            _reached(s.size())
+    return frame.best_move
 
 
 class TreeNode:
@@ -144,6 +928,7 @@ class TreeNode:
     children - the possible moves from the GameState value
     score - the score of the current state
     """
+    __slots__ = ('value', 'children', 'score')
     value: GameState
     children: List["TreeNode"]
     score: int
@@ -168,9 +953,450 @@ class TreeNode:
         self.score = score
 
 
+class SearchFrame:
+    """
+    A state on the path searched by minimax_iterative_strategy.
+
+    DONE - the move given once every move of the state has been searched
+    state - the state being searched
+    moves - the moves of state that have not been searched yet
+    move - the move being searched
+    score - the best score of the moves searched so far
+    best_move - the move with that score
+    """
+    __slots__ = ('state', 'moves', 'move', 'score', 'best_move')
+    DONE = object()
+    state: GameState
+    moves: Iterator
+    move: Any
+    score: float
+    best_move: Any
+
+    def __init__(self, state: GameState, moves: list = None) -> None:
+        """
+        Create SearchFrame self for state, with none of its moves searched.
+        moves are the moves to search, all moves of state if not given.
+
+        >>> from subtract_square_state import SubtractSquareState
+        >>> frame = SearchFrame(SubtractSquareState(True, 5))
+        >>> list(frame.moves), frame.score
+        ([1, 4], -2)
+        """
+        self.state = state
+        if moves is None:
+            moves = state.get_possible_moves()
+        self.moves = iter(moves)
+        self.move = None
+        self.score = state.LOSE - 1
+        self.best_move = None
+
+
+class MCTSNode:
+    """
+    A state in the tree searched by mcts_strategy.
+
+    state - the state
+    move - the move that led to state from the parent's state
+    parent - the node of the state before, or None at the root
+    children - the nodes of the moves of state tried so far
+    untried - the moves of state not tried yet
+    visits - the number of iterations that passed through this node
+    total - the sum of the results of those iterations for the player who
+            made move
+    terminal - the score of state for the player about to move if the game
+               is over there, or None
+    """
+    __slots__ = ('state', 'move', 'parent', 'children', 'untried', 'visits',
+                 'total', 'terminal')
+    state: GameState
+    move: Any
+    parent: Optional["MCTSNode"]
+    children: List["MCTSNode"]
+    untried: list
+    visits: int
+    total: float
+    terminal: Optional[int]
+
+    def __init__(self, game: Game, state: GameState, move: Any = None,
+                 parent: "MCTSNode" = None) -> None:
+        """
+        Create MCTSNode self for state of game, reached by move from parent,
+        with none of its moves tried.
+
+        >>> from subtract_square_game import SubtractSquareGame
+        >>> from subtract_square_state import SubtractSquareState
+        >>> game = SubtractSquareGame(True, 5)
+        >>> node = MCTSNode(game, game.current_state)
+        >>> sorted(node.untried), node.terminal
+        ([1, 4], None)
+        >>> MCTSNode(game, SubtractSquareState(True, 0)).terminal
+        -1
+        """
+        self.state = state
+        self.move = move
+        self.parent = parent
+        self.children = []
+        self.terminal = terminal_score(game, state)
+        self.untried = []
+        if self.terminal is None:
+            self.untried = list(state.get_possible_moves())
+        self.visits = 0
+        self.total = 0.0
+
+    def best_child(self, exploration: float) -> "MCTSNode":
+        """
+        Return the child of MCTSNode self with the highest UCT value: its
+        mean result plus exploration times a bonus that shrinks as the child
+        is visited more.
+
+        Precondition: every child has been visited.
+        """
+        log_visits = math.log(self.visits)
+        return max(self.children,
+                   key=lambda child: (child.total / child.visits
+                                      + exploration
+                                      * math.sqrt(log_visits
+                                                  / child.visits)))
+
+
+class TableEntry:
+    """
+    A search result stored in a TranspositionTable.
+
+    EXACT - flag for a score that is the exact value of the state
+    LOWER - flag for a score that is a lower bound on the value of the state
+    UPPER - flag for a score that is an upper bound on the value of the state
+    score - the score of the state for the player about to move
+    depth - how many moves below the state were searched
+    flag - whether score is EXACT, a LOWER bound or an UPPER bound
+    move - the best move found from the state, if any
+    """
+    EXACT: int = 0
+    LOWER: int = 1
+    UPPER: int = 2
+    __slots__ = ('score', 'depth', 'flag', 'move')
+    score: float
+    depth: float
+    flag: int
+    move: Any
+
+    def __init__(self, score: float, depth: float = float('inf'),
+                 flag: int = 0, move: Any = None) -> None:
+        """
+        Create TableEntry self for a state with score searched depth moves
+        deep. A depth of infinity means the state was searched to the end of
+        the game.
+
+        >>> entry = TableEntry(1)
+        >>> entry.score, entry.depth, entry.flag, entry.move
+        (1, inf, 0, None)
+        """
+        self.score = score
+        self.depth = depth
+        self.flag = flag
+        self.move = move
+
+    def solved(self) -> bool:
+        """
+        Return whether TableEntry self holds the exact score of a state
+        searched to the end of the game.
+
+        >>> TableEntry(1).solved()
+        True
+        >>> TableEntry(1, 3).solved()
+        False
+        >>> TableEntry(1, flag=TableEntry.LOWER).solved()
+        False
+        """
+        return self.flag == TableEntry.EXACT and self.depth == float('inf')
+
+
+class TranspositionTable:
+    """
+    A bounded cache of search results keyed by game state. Once the table
+    is full, the least recently used entry is evicted.
+
+    max_size - the most entries the table holds
+    key_func - the function turning the keys looked up and stored into the
+               keys held, or None to hold them as they are
+    hits - the number of lookups that found an entry
+    misses - the number of lookups that found nothing
+    evictions - the number of entries removed to make room for others
+    """
+    max_size: int
+    key_func: Optional[Callable[[Hashable], Hashable]]
+    hits: int
+    misses: int
+    evictions: int
+
+    def __init__(self, max_size: int = 1000000,
+                 key_func: Callable[[Hashable], Hashable] = None) -> None:
+        """
+        Create an empty TranspositionTable self holding at most max_size
+        entries, held under the keys key_func gives if it is given.
+
+        >>> table = TranspositionTable(10)
+        >>> len(table), table.hits, table.misses, table.evictions
+        (0, 0, 0, 0)
+        >>> table = TranspositionTable(10, abs)
+        >>> table.store(-1, TableEntry(1))
+        >>> table.lookup(1).score
+        1
+        """
+        self.max_size = max_size
+        self.key_func = key_func
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def __len__(self) -> int:
+        """
+        Return the number of entries in TranspositionTable self.
+
+        >>> table = TranspositionTable()
+        >>> table.store('a', TableEntry(1))
+        >>> len(table)
+        1
+        """
+        return len(self._entries)
+
+    def lookup(self, key: Hashable) -> Optional[TableEntry]:
+        """
+        Return the entry stored for key, or None if there is none.
+
+        >>> table = TranspositionTable()
+        >>> table.lookup('a') is None
+        True
+        >>> table.store('a', TableEntry(1))
+        >>> table.lookup('a').score
+        1
+        >>> table.hits, table.misses
+        (1, 1)
+        """
+        if self.key_func is not None:
+            key = self.key_func(key)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._entries.move_to_end(key)
+        return entry
+
+    def store(self, key: Hashable, entry: TableEntry) -> None:
+        """
+        Store entry for key, evicting the least recently used entry if
+        TranspositionTable self is full.
+
+        >>> table = TranspositionTable(2)
+        >>> table.store('a', TableEntry(1))
+        >>> table.store('b', TableEntry(-1))
+        >>> _ = table.lookup('a')
+        >>> table.store('c', TableEntry(0))
+        >>> table.lookup('b') is None
+        True
+        >>> table.evictions
+        1
+        """
+        if self.key_func is not None:
+            key = self.key_func(key)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+        elif len(self._entries) >= self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        self._entries[key] = entry
+
+    def clear(self) -> None:
+        """
+        Remove every entry and reset the counters of TranspositionTable self.
+
+        >>> table = TranspositionTable()
+        >>> table.store('a', TableEntry(1))
+        >>> table.clear()
+        >>> len(table), table.hits, table.misses, table.evictions
+        (0, 0, 0, 0)
+        """
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+class DepthPreferredTable(TranspositionTable):
+    """
+    A TranspositionTable with one slot per hash bucket. A new entry only
+    replaces the entry in its slot if it was searched at least as deep.
+    """
+
+    def __init__(self, max_size: int = 1000000,
+                 key_func: Callable[[Hashable], Hashable] = None) -> None:
+        """
+        Create an empty DepthPreferredTable self with max_size slots, held
+        under the keys key_func gives if it is given.
+
+        >>> len(DepthPreferredTable(10))
+        0
+        """
+        TranspositionTable.__init__(self, max_size, key_func)
+        self._slots = [None] * max_size
+        self._size = 0
+
+    def __len__(self) -> int:
+        """
+        Return the number of entries in DepthPreferredTable self.
+
+        >>> table = DepthPreferredTable(10)
+        >>> table.store('a', TableEntry(1))
+        >>> len(table)
+        1
+        """
+        return self._size
+
+    def lookup(self, key: Hashable) -> Optional[TableEntry]:
+        """
+        Return the entry stored for key, or None if there is none.
+
+        >>> table = DepthPreferredTable(10)
+        >>> table.store('a', TableEntry(1))
+        >>> table.lookup('a').score
+        1
+        """
+        if self.key_func is not None:
+            key = self.key_func(key)
+        slot = self._slots[hash(key) % self.max_size]
+        if slot is not None and slot[0] == key:
+            self.hits += 1
+            return slot[1]
+        self.misses += 1
+        return None
+
+    def store(self, key: Hashable, entry: TableEntry) -> None:
+        """
+        Store entry for key unless its slot holds a different key searched
+        deeper than entry.
+
+        >>> table = DepthPreferredTable(1)
+        >>> table.store('a', TableEntry(1, 3))
+        >>> table.store('b', TableEntry(1, 2))
+        >>> table.lookup('b') is None
+        True
+        >>> table.store('b', TableEntry(1, 5))
+        >>> table.lookup('b').depth, table.evictions
+        (5, 1)
+        """
+        if self.key_func is not None:
+            key = self.key_func(key)
+        i = hash(key) % self.max_size
+        slot = self._slots[i]
+        if slot is None:
+            self._size += 1
+        elif slot[0] != key:
+            if slot[1].depth > entry.depth:
+                return
+            self.evictions += 1
+        self._slots[i] = (key, entry)
+
+    def clear(self) -> None:
+        """
+        Remove every entry and reset the counters of DepthPreferredTable
+        self.
+
+        >>> table = DepthPreferredTable(10)
+        >>> table.store('a', TableEntry(1))
+        >>> table.clear()
+        >>> len(table)
+        0
+        """
+        TranspositionTable.clear(self)
+        self._slots = [None] * self.max_size
+        self._size = 0
+
+
+class SearchStats:
+    """
+    Counters describing the last search made by a strategy.
+
+    nodes - the number of states visited
+    cutoffs - the number of times the remaining moves of a state were pruned
+    estimated - the number of states scored by rough_outcome at the depth
+                limit of a search, or by a table entry resting on such
+                scores
+    terminal_checks - the number of states checked for the end of the game
+    moves_made - the number of moves made to reach the states searched
+    max_depth - the most moves below the current state a search reached
+    """
+    nodes: int
+    cutoffs: int
+    estimated: int
+    terminal_checks: int
+    moves_made: int
+    max_depth: int
+
+    def __init__(self) -> None:
+        """
+        Create SearchStats self with every counter at 0.
+
+        >>> stats = SearchStats()
+        >>> stats.nodes, stats.cutoffs, stats.estimated, stats.max_depth
+        (0, 0, 0, 0)
+        """
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Set every counter of SearchStats self back to 0.
+
+        >>> stats = SearchStats()
+        >>> stats.nodes = 5
+        >>> stats.reset()
+        >>> stats.nodes
+        0
+        """
+        self.nodes = 0
+        self.cutoffs = 0
+        self.estimated = 0
+        self.terminal_checks = 0
+        self.moves_made = 0
+        self.max_depth = 0
+
+    def merge(self, other: "SearchStats") -> None:
+        """
+        Add the counters of other, from another part of the same search, to
+        SearchStats self.
+
+        >>> stats, other = SearchStats(), SearchStats()
+        >>> stats.nodes, stats.max_depth = 3, 5
+        >>> other.nodes, other.max_depth = 4, 2
+        >>> stats.merge(other)
+        >>> stats.nodes, stats.max_depth
+        (7, 5)
+        """
+        self.nodes += other.nodes
+        self.cutoffs += other.cutoffs
+        self.estimated += other.estimated
+        self.terminal_checks += other.terminal_checks
+        self.moves_made += other.moves_made
+        self.max_depth = max(self.max_depth, other.max_depth)
+
+
+# the counters of the last search made by a strategy
+last_search_stats = SearchStats()
+
+# the function root_moves uses to choose which moves of a state to search,
+# or None to search all of them; see symmetry.use_symmetry
+root_move_filter = None
+
+# the table shared by the minimax strategies; replace it with another
+# TranspositionTable to change its size or replacement policy
+transposition_table = TranspositionTable()
+
+
 class Stack:
     """ Last-in, first-out (LIFO) stack.
     """
+    __slots__ = ('_contains',)
 
     def __init__(self) -> None:
         """ Create a new, empty Stack self.
@@ -179,7 +1405,7 @@ class Stack:
         """
         self._contains = []
 
-    def add(self, obj: TreeNode) -> None:
+    def add(self, obj: Any) -> None:
         """ Add object obj to top of Stack self.
 
         >>> state = GameState(True)
@@ -189,7 +1415,7 @@ class Stack:
         """
         self._contains.append(obj)
 
-    def remove(self) -> TreeNode:
+    def remove(self) -> Any:
         """
         Remove and return top element of Stack self.
 
@@ -219,6 +1445,17 @@ class Stack:
         """
         return len(self._contains) == 0
 
+    def size(self) -> int:
+        """
+        Return the number of elements in Stack self.
+
+        >>> s = Stack()
+        >>> s.add(1)
+        >>> s.size()
+        1
+        """
+        return len(self._contains)
+
 
 if __name__ == "__main__":
     from python_ta import check_all
@@ -12,16 +12,20 @@ class SubtractSquareGame(Game):
     Abstract class for a game to be played with two players.
     """
 
-    def __init__(self, p1_starts):
+    def __init__(self, p1_starts, total=None):
         """
         Initialize this Game, using p1_starts to find who the first player is.
+        The number to subtract from is asked for unless total is given.
 
         :param p1_starts: A boolean representing whether Player 1 is the first
                           to make a move.
         :type p1_starts: bool
+        :param total: The number to subtract from.
+        :type total: int
         """
-        count = int(input("Enter the number to subtract from: "))
-        self.current_state = SubtractSquareState(p1_starts, count)
+        if total is None:
+            total = input("Enter the number to subtract from: ")
+        self.current_state = SubtractSquareState(p1_starts, int(total))
 
     def get_instructions(self):
         """
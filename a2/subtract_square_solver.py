@@ -0,0 +1,144 @@
+"""
+A solver for Subtract Square.
+
+The player about to move wins from a total exactly when some square can be
+subtracted to leave a total the other player loses from, so every total up
+to a bound is solved once, bottom up, into a table of winning totals.
+
+NOTE: You do not have to run python-ta on this file.
+"""
+from math import isqrt
+from typing import Any, Optional
+from game import Game
+from subtract_square_state import SubtractSquareState
+from strategy import alpha_beta_strategy, instrumented
+
+# the first bytes of a saved WinTable
+MAGIC = b'SSWT'
+
+# the largest total solved when table_strategy first needs a table
+DEFAULT_SIZE = 100000
+
+
+class WinTable:
+    """
+    Which totals of Subtract Square are won by the player about to move,
+    stored as one bit per total.
+
+    size - the largest total in the table
+    """
+    size: int
+
+    def __init__(self, size: int, bits: bytearray = None) -> None:
+        """
+        Create WinTable self for the totals 0 to size, solving them unless
+        their bits are given.
+
+        >>> table = WinTable(10)
+        >>> [total for total in range(11) if not table.is_winning(total)]
+        [0, 2, 5, 7, 10]
+        """
+        self.size = size
+        if bits is not None:
+            self._bits = bits
+            return
+
+        # a total no move reaches a loss from is a loss, and every total a
+        # square above a loss is a win
+        self._bits = bytearray(size // 8 + 1)
+        for total in range(size + 1):
+            if not self._bits[total >> 3] >> (total & 7) & 1:
+                root = 1
+                while total + root * root <= size:
+                    won = total + root * root
+                    self._bits[won >> 3] |= 1 << (won & 7)
+                    root += 1
+
+    def is_winning(self, total: int) -> bool:
+        """
+        Return whether the player about to move wins from total.
+
+        Precondition: 0 <= total <= self.size
+
+        >>> table = WinTable(10)
+        >>> table.is_winning(0), table.is_winning(4), table.is_winning(5)
+        (False, True, False)
+        """
+        return bool(self._bits[total >> 3] >> (total & 7) & 1)
+
+    def winning_move(self, total: int) -> Optional[int]:
+        """
+        Return a square to subtract from total that leaves the other player
+        losing, or None if every move loses.
+
+        Precondition: 0 <= total <= self.size
+
+        >>> table = WinTable(10)
+        >>> table.winning_move(6), table.winning_move(9)
+        (4, 9)
+        >>> table.winning_move(7) is None
+        True
+        """
+        for root in range(isqrt(total), 0, -1):
+            if not self.is_winning(total - root * root):
+                return root * root
+        return None
+
+    def save(self, path: str) -> None:
+        """
+        Write WinTable self to the file at path, to be read by load_table.
+        """
+        with open(path, 'wb') as file:
+            file.write(MAGIC)
+            file.write(self.size.to_bytes(8, 'little'))
+            file.write(self._bits)
+
+
+def load_table(path: str) -> WinTable:
+    """
+    Return the WinTable saved at path by WinTable.save.
+    """
+    with open(path, 'rb') as file:
+        data = file.read()
+    if data[:4] != MAGIC:
+        raise ValueError('{} is not a saved WinTable'.format(path))
+    return WinTable(int.from_bytes(data[4:12], 'little'), bytearray(data[12:]))
+
+
+# the table used by table_strategy, grown when a larger total is played
+_table = None
+
+
+def solver_table(total: int) -> WinTable:
+    """
+    Return a WinTable covering total, solving a larger one if needed.
+
+    >>> solver_table(50).size >= 50
+    True
+    """
+    global _table
+    if _table is None or _table.size < total:
+        _table = WinTable(max(total, DEFAULT_SIZE,
+                              0 if _table is None else 2 * _table.size))
+    return _table
+
+
+@instrumented
+def table_strategy(game: Game) -> Any:
+    """
+    Return a move for game by looking its total up in a WinTable, or any
+    move if the total is lost. Games other than Subtract Square are left to
+    alpha_beta_strategy.
+    """
+    state = game.current_state
+    if not isinstance(state, SubtractSquareState):
+        return alpha_beta_strategy(game)
+    move = solver_table(state.current_total).winning_move(state.current_total)
+    if move is None:
+        return 1
+    return move
+
+
+if __name__ == "__main__":
+    from python_ta import check_all
+    check_all(config="a2_pyta.txt")
@@ -3,14 +3,31 @@ An implementation of a state for SubtractSquare.
 
 NOTE: You do not have to run python-ta on this file.
 """
-from typing import Any
+from math import isqrt
+from typing import Any, List, Optional, Sequence
 from game_state import GameState
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# the perfect squares 0, 1, 4, ... computed so far, shared by every state
+_SQUARES = [0]
+
+# child_outcomes scores fewer moves than this one by one, which is faster
+BATCH_MIN_MOVES = 24
 
 
 class SubtractSquareState(GameState):
     """
     The state of a game at a certain point in time.
+
+    current_total - the total left to subtract squares from
+    move_stack - the moves applied and not yet undone, or None before apply
+                 is first called
     """
+    current_total: int
+    move_stack: Optional[List[int]]
 
     def __init__(self, is_p1_turn: bool, current_total: int) -> None:
         """
@@ -19,6 +36,7 @@ class SubtractSquareState(GameState):
         """
         super().__init__(is_p1_turn)
         self.current_total = current_total
+        self.move_stack = None
 
     def __str__(self) -> str:
         """
@@ -29,13 +47,11 @@ class SubtractSquareState(GameState):
     def get_possible_moves(self) -> list:
         """
         Return all possible moves that can be applied to this state.
-        """
-        moves = []
-        for i in range(1, self.current_total + 1):
-            if i ** 2 <= self.current_total:
-                moves.append(i ** 2)
 
-        return moves
+        >>> SubtractSquareState(True, 10).get_possible_moves()
+        [1, 4, 9]
+        """
+        return squares_up_to(self.current_total)
 
     def make_move(self, move: Any) -> "SubtractSquareState":
         """
@@ -48,6 +64,60 @@ class SubtractSquareState(GameState):
                                         self.current_total - move)
         return new_state
 
+    def apply(self, move: Any) -> None:
+        """
+        Apply move to this state in place, to be taken back by undo.
+        Override GameState.apply(self)
+
+        >>> state = SubtractSquareState(True, 10)
+        >>> state.apply(9)
+        >>> state
+        P1's Turn: False - Total: 1
+        >>> state.undo()
+        >>> state
+        P1's Turn: True - Total: 10
+        """
+        if type(move) == str:
+            move = int(move)
+        if self.move_stack is None:
+            self.move_stack = []
+        self.move_stack.append(move)
+        self.current_total -= move
+        self.p1_turn = not self.p1_turn
+
+    def undo(self) -> None:
+        """
+        Take back the last move applied to this state and not yet undone.
+        Override GameState.undo(self)
+        """
+        if not self.move_stack:
+            raise ValueError('there is no move to undo')
+        self.current_total += self.move_stack.pop()
+        self.p1_turn = not self.p1_turn
+
+    def __eq__(self, other: Any) -> bool:
+        """
+        Return whether SubtractSquareState self is equivalent to other.
+
+        >>> SubtractSquareState(True, 5) == SubtractSquareState(True, 5)
+        True
+        >>> SubtractSquareState(True, 5) == SubtractSquareState(False, 5)
+        False
+        """
+        return (type(self) == type(other)
+                and self.p1_turn == other.p1_turn
+                and self.current_total == other.current_total)
+
+    def __hash__(self) -> int:
+        """
+        Return a hash of SubtractSquareState self, equal for equivalent states.
+
+        >>> state = SubtractSquareState(True, 5)
+        >>> hash(state) == hash(SubtractSquareState(True, 5))
+        True
+        """
+        return hash((self.p1_turn, self.current_total))
+
     def __repr__(self) -> str:
         """
         Return a representation of this state (which can be used for
@@ -63,12 +133,39 @@ class SubtractSquareState(GameState):
         """
         if is_pos_square(self.current_total):
             return self.WIN
-        elif all([is_pos_square(self.current_total - n ** 2)
-                  for n in range(1, self.current_total + 1)
-                  if n ** 2 < self.current_total]):
-            return self.LOSE
+        for square in squares_up_to(self.current_total - 1):
+            if not is_pos_square(self.current_total - square):
+                return self.DRAW
+        return self.LOSE
+
+    def child_outcomes(self, moves: list) -> Any:
+        """
+        Return the rough_outcome of the state after each of moves, for the
+        player about to move there. At least BATCH_MIN_MOVES moves are
+        scored together by rough_outcomes.
+        Override GameState.child_outcomes(self)
+
+        >>> state = SubtractSquareState(True, 10)
+        >>> [float(score) for score in state.child_outcomes([1, 4, 9])]
+        [1.0, 0.0, 1.0]
+        >>> state = SubtractSquareState(True, 1000)
+        >>> scores = state.child_outcomes(state.get_possible_moves())
+        >>> len(scores), float(max(scores))
+        (31, 1.0)
+        """
+        totals = [self.current_total - int(move) for move in moves]
+        if np is None or self.batches_child_outcomes(moves):
+            return rough_outcomes(totals)
+        return np.array([SubtractSquareState(True, total).rough_outcome()
+                         for total in totals], dtype=float)
 
-        return self.DRAW
+    def batches_child_outcomes(self, moves: list) -> bool:
+        """
+        Return whether child_outcomes scores the states after moves without
+        making them.
+        Override GameState.batches_child_outcomes(self)
+        """
+        return np is not None and len(moves) >= BATCH_MIN_MOVES
 
 
 def is_pos_square(n: int) -> bool:
@@ -80,7 +177,63 @@ def is_pos_square(n: int) -> bool:
     >>> is_pos_square(9)
     True
     """
-    return 0 < n and (round(n ** 0.5) ** 2 == n)
+    return 0 < n and isqrt(n) ** 2 == n
+
+
+def squares_up_to(n: int) -> List[int]:
+    """
+    Return the positive perfect squares no greater than n, in increasing
+    order.
+
+    >>> squares_up_to(17)
+    [1, 4, 9, 16]
+    >>> squares_up_to(0)
+    []
+    """
+    root = isqrt(n) if n > 0 else 0
+    while len(_SQUARES) <= root:
+        _SQUARES.append(len(_SQUARES) ** 2)
+    return _SQUARES[1:root + 1]
+
+
+def rough_outcomes(totals: Sequence[int]) -> Any:
+    """
+    Return the rough_outcome of a state with each total in totals, for the
+    player about to move. With NumPy installed the totals are scored
+    together as a numpy array; otherwise a list is returned.
+
+    >>> [float(score) for score in rough_outcomes([0, 4, 5, 6])]
+    [-1.0, 1.0, -1.0, 0.0]
+    """
+    if np is None:
+        return [SubtractSquareState(True, total).rough_outcome()
+                for total in totals]
+
+    totals = np.asarray(totals, dtype=np.int64)
+    win = _are_pos_squares(totals)
+    lose = np.ones(totals.shape, dtype=bool)
+    largest = int(totals.max()) if totals.size else 0
+    for square in squares_up_to(largest - 1):
+        smaller = square < totals
+        # stop once every total that could still lose has no smaller square
+        if not (lose & smaller).any():
+            break
+        lose &= ~smaller | _are_pos_squares(totals - square)
+    return np.where(win, GameState.WIN,
+                    np.where(lose, GameState.LOSE, GameState.DRAW)
+                    ).astype(float)
+
+
+def _are_pos_squares(values: Any) -> Any:
+    """
+    Return a numpy array of whether each of the numpy array values is a
+    positive perfect square.
+    """
+    roots = np.floor(np.sqrt(np.maximum(values, 0))).astype(np.int64)
+    # correct the float square roots of large values by one either way
+    roots += (roots + 1) ** 2 <= values
+    roots -= roots ** 2 > values
+    return (values > 0) & (roots ** 2 == values)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,132 @@
+"""
+A module to treat the symmetric positions of a game as one.
+
+A Stonehenge gameboard can be rotated and reflected without changing who
+wins, so every state is mapped to the representative of its symmetric
+states with the smallest cells and leylines. Subtract Square has no
+symmetries: every state is its own representative.
+
+NOTE: You do not have to run python-ta on this file.
+"""
+from typing import Any, Hashable, Tuple
+import strategy
+from game_state import GameState
+from stonehenge_state import StonehengeState, board_symmetries
+
+
+def canonical_state(state: GameState) -> Tuple[GameState, int]:
+    """
+    Return the representative of the states symmetric to state, and the
+    number of the symmetry that moves state onto it.
+
+    >>> state = StonehengeState(True, 2)
+    >>> corner = canonical_state(state.make_move('A'))[0]
+    >>> corner == canonical_state(state.make_move('G'))[0]
+    True
+    >>> corner == canonical_state(state.make_move('D'))[0]
+    False
+    """
+    if not isinstance(state, StonehengeState):
+        return state, 0
+    symmetry = _canonical_symmetry(state)[1]
+    if symmetry == 0:
+        return state, 0
+    return state.symmetric(symmetry), symmetry
+
+
+def canonical_key(state: GameState) -> Hashable:
+    """
+    Return a key equal for state and every state symmetric to it, to be
+    used as the key_func of a strategy.TranspositionTable.
+
+    >>> state = StonehengeState(True, 2)
+    >>> key = canonical_key(state.make_move('A'))
+    >>> key == canonical_key(state.make_move('G'))
+    True
+    """
+    if not isinstance(state, StonehengeState):
+        return state
+    return (state.length, state.p1_turn) + _canonical_symmetry(state)[0]
+
+
+def _canonical_symmetry(state: StonehengeState
+                        ) -> Tuple[Tuple[int, int, str], int]:
+    """
+    Return the smallest fields of the states symmetric to state, as given by
+    StonehengeState.symmetric_fields, and the number of the symmetry giving
+    them; the first such symmetry if there are several.
+    """
+    best = (state.p1_cells, state.p2_cells, ''.join(state.leylines))
+    best_symmetry = 0
+    for symmetry in range(1, len(board_symmetries(state.length))):
+        fields = state.symmetric_fields(symmetry)
+        if fields < best:
+            best, best_symmetry = fields, symmetry
+    return best, best_symmetry
+
+
+def original_move(state: GameState, move: Any, symmetry: int) -> Any:
+    """
+    Return the move from state that becomes move once state is moved by
+    symmetry, as returned by canonical_state.
+
+    >>> state = StonehengeState(True, 2).make_move('E')
+    >>> canonical, symmetry = canonical_state(state)
+    >>> moves = canonical.get_possible_moves()
+    >>> sorted(original_move(state, move, symmetry) for move in moves)
+    ['A', 'B', 'C', 'D', 'F', 'G']
+    """
+    if not isinstance(state, StonehengeState):
+        return move
+    return state.symmetric_move(move, symmetry, True)
+
+
+def unique_moves(state: GameState) -> list:
+    """
+    Return the moves of state, leaving out every move that a symmetry
+    keeping state the same turns into an earlier move.
+
+    >>> unique_moves(StonehengeState(True, 2))
+    ['A', 'D']
+    >>> unique_moves(StonehengeState(True, 2).make_move('A'))
+    ['B', 'D', 'E', 'G']
+    """
+    moves = state.get_possible_moves()
+    if not isinstance(state, StonehengeState):
+        return moves
+    keeping = [symmetry for symmetry
+               in range(1, len(board_symmetries(state.length)))
+               if state.symmetric(symmetry) == state]
+    result = []
+    seen = set()
+    for move in moves:
+        if move not in seen:
+            result.append(move)
+            seen.update(state.symmetric_move(move, symmetry)
+                        for symmetry in keeping)
+    return result
+
+
+def use_symmetry(enabled: bool = True, max_size: int = 1000000) -> None:
+    """
+    Make the minimax strategies in strategy share one result between
+    symmetric states and search only one of every set of symmetric moves
+    from the current state, or stop doing so if not enabled. Either way
+    strategy.transposition_table is replaced by an empty table of max_size
+    entries.
+
+    The best moves stored in a shared entry may belong to a symmetric
+    state, so they are only used to order moves, never played.
+    """
+    if enabled:
+        strategy.transposition_table = strategy.TranspositionTable(
+            max_size, canonical_key)
+        strategy.root_move_filter = unique_moves
+    else:
+        strategy.transposition_table = strategy.TranspositionTable(max_size)
+        strategy.root_move_filter = None
+
+
+if __name__ == "__main__":
+    from python_ta import check_all
+    check_all(config="a2_pyta.txt")
@@ -0,0 +1,283 @@
+"""
+A module to play our games between strategies without a human at the
+keyboard, and report how each strategy did.
+
+Run it from the command line, e.g. to play 10 games of side-length 2
+Stonehenge between alpha-beta and recursive minimax:
+
+    python tournament.py h ab mr --length 2 --matches 10
+
+NOTE: You do not have to run python-ta on this file.
+The interactive strategy 'i' still asks for moves, so it cannot be used in
+a tournament: only the strategies in tournament_strategies can.
+"""
+import argparse
+import contextlib
+import json
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import strategy
+from game_interface import GameInterface, playable_games, usable_strategies
+
+# the strategies that choose their moves without asking, by their keys in
+# usable_strategies
+tournament_strategies = {key: strategy_ for key, strategy_
+                         in usable_strategies.items()
+                         if strategy_ is not strategy.interactive_strategy}
+
+
+class TimedStrategy:
+    """
+    A strategy that records how long each of its moves took to choose and
+    how many states its search visited.
+
+    strategy - the strategy choosing the moves
+    times - the seconds taken by each move
+    nodes - the states visited for each move, 0 for strategies that do not
+            report them in strategy.last_search_stats
+    """
+    strategy: Callable[[Any], Any]
+    times: List[float]
+    nodes: List[int]
+
+    def __init__(self, strategy_: Callable[[Any], Any]) -> None:
+        """
+        Create TimedStrategy self recording the moves of strategy_.
+        """
+        self.strategy = strategy_
+        self.times = []
+        self.nodes = []
+
+    def __call__(self, game: Any) -> Any:
+        """
+        Return the move chosen for game by self.strategy, recording its time
+        and node count.
+        """
+        strategy.last_search_stats.reset()
+        start = time.perf_counter()
+        move = self.strategy(game)
+        self.times.append(time.perf_counter() - start)
+        self.nodes.append(strategy.last_search_stats.nodes)
+        return move
+
+
+class MatchResult:
+    """
+    The result of one game between two strategies.
+
+    first - the key in tournament_strategies of the first strategy
+    second - the key in tournament_strategies of the second strategy
+    first_is_p1 - whether the first strategy played as Player 1
+    winner - 'first', 'second' or None for a tie
+    first_times, second_times - the seconds taken by each move of a strategy
+    first_nodes, second_nodes - the states visited by each move of a
+                                strategy
+    """
+    first: str
+    second: str
+    first_is_p1: bool
+    winner: Optional[str]
+    first_times: List[float]
+    second_times: List[float]
+    first_nodes: List[int]
+    second_nodes: List[int]
+
+    def __init__(self, first: str, second: str, first_is_p1: bool,
+                 winner: Optional[str], first_player: TimedStrategy,
+                 second_player: TimedStrategy) -> None:
+        """
+        Create MatchResult self from the timed strategies that played it.
+        """
+        self.first = first
+        self.second = second
+        self.first_is_p1 = first_is_p1
+        self.winner = winner
+        self.first_times = first_player.times
+        self.second_times = second_player.times
+        self.first_nodes = first_player.nodes
+        self.second_nodes = second_player.nodes
+
+
+def play_match(game_key: str, first: str, second: str,
+               first_is_p1: bool = True, p1_starts: bool = True,
+               **game_options: Any) -> MatchResult:
+    """
+    Play one quiet game of playable_games[game_key] between the strategies
+    tournament_strategies[first] and tournament_strategies[second], and
+    return its result. game_options are passed to the game, e.g. length
+    for Stonehenge or total for Subtract Square.
+
+    The shared transposition table is cleared first so that every match is
+    played the same way whatever was played before it.
+
+    >>> result = play_match('s', 'mr', 'ro', total=20)
+    >>> result.winner
+    'first'
+    >>> play_match('s', 'i', 'ro', total=20)
+    Traceback (most recent call last):
+    ...
+    ValueError: strategy 'i' cannot play in a tournament
+    """
+    for key in (first, second):
+        if key not in tournament_strategies:
+            raise ValueError(
+                "strategy '{}' cannot play in a tournament".format(key))
+    strategy.transposition_table.clear()
+    first_player = TimedStrategy(tournament_strategies[first])
+    second_player = TimedStrategy(tournament_strategies[second])
+    if first_is_p1:
+        interface = GameInterface(playable_games[game_key], first_player,
+                                  second_player, p1_starts, False,
+                                  **game_options)
+    else:
+        interface = GameInterface(playable_games[game_key], second_player,
+                                  first_player, p1_starts, False,
+                                  **game_options)
+    winner = interface.play()
+    if winner is not None:
+        winner = 'first' if (winner == 'p1') == first_is_p1 else 'second'
+    return MatchResult(first, second, first_is_p1, winner, first_player,
+                       second_player)
+
+
+def run_tournament(game_key: str, first: str, second: str, matches: int,
+                   alternate: bool = True, p1_starts: bool = True,
+                   workers: int = 1, seed: int = 0,
+                   **game_options: Any) -> List[MatchResult]:
+    """
+    Play matches games of playable_games[game_key] between the strategies
+    first and second, and return their results in order. If alternate, the
+    strategies swap seats every game, starting with first as Player 1.
+
+    With more than one worker the games are shared out over that many
+    processes. Game i seeds the random module with seed + i before it is
+    played, so the results do not depend on which process played it.
+
+    >>> results = run_tournament('s', 'ro', 'mr', 2, total=10)
+    >>> [result.first_is_p1 for result in results]
+    [True, False]
+    >>> results = run_tournament('s', 'ro', 'mr', 2, workers=2, total=10)
+    >>> [result.winner for result in results]
+    ['second', 'first']
+    """
+    jobs = [(game_key, first, second, not alternate or i % 2 == 0,
+             p1_starts, seed + i, game_options) for i in range(matches)]
+    if workers <= 1 or matches <= 1:
+        return [_play_job(job) for job in jobs]
+    with ProcessPoolExecutor(workers) as pool:
+        return list(pool.map(_play_job, jobs,
+                             chunksize=max(1, matches // (4 * workers))))
+
+
+def _play_job(job: Tuple[str, str, str, bool, bool, int, Dict[str, Any]]
+              ) -> MatchResult:
+    """
+    Return the result of the match described by job, the arguments of
+    play_match with the seed of the random module before its game options.
+    """
+    game_key, first, second, first_is_p1, p1_starts, seed, game_options = job
+    random.seed(seed)
+    return play_match(game_key, first, second, first_is_p1, p1_starts,
+                      **game_options)
+
+
+def summarise(results: List[MatchResult]) -> Dict[str, Any]:
+    """
+    Return the win rates, move latencies and node counts of the first and
+    second strategies over results.
+
+    >>> summary = summarise(run_tournament('s', 'mr', 'ro', 2, total=20))
+    >>> summary['first']['wins'] + summary['second']['wins']
+    2
+    """
+    summary = {'matches': len(results),
+               'ties': sum(result.winner is None for result in results)}
+    for seat in ('first', 'second'):
+        times = [t for result in results
+                 for t in getattr(result, seat + '_times')]
+        nodes = [n for result in results
+                 for n in getattr(result, seat + '_nodes')]
+        wins = sum(result.winner == seat for result in results)
+        summary[seat] = {
+            'strategy': getattr(results[0], seat) if results else None,
+            'wins': wins,
+            'win_rate': wins / len(results) if results else 0.0,
+            'moves': len(times),
+            'mean_move_seconds': sum(times) / len(times) if times else 0.0,
+            'max_move_seconds': max(times) if times else 0.0,
+            'nodes': sum(nodes),
+            'mean_move_nodes': sum(nodes) / len(nodes) if nodes else 0.0}
+    return summary
+
+
+def _format_summary(summary: Dict[str, Any]) -> str:
+    """
+    Return summary as a table to print.
+    """
+    lines = ['{} matches, {} ties'.format(summary['matches'],
+                                          summary['ties']),
+             '{:<8} {:>6} {:>8} {:>12} {:>12} {:>12}'.format(
+                 'strategy', 'wins', 'win rate', 'mean move s',
+                 'max move s', 'mean nodes')]
+    for seat in ('first', 'second'):
+        row = summary[seat]
+        lines.append('{:<8} {:>6} {:>8.1%} {:>12.6f} {:>12.6f} {:>12.1f}'
+                     .format(row['strategy'], row['wins'], row['win_rate'],
+                             row['mean_move_seconds'],
+                             row['max_move_seconds'],
+                             row['mean_move_nodes']))
+    return '\n'.join(lines)
+
+
+def main(args: List[str] = None) -> None:
+    """
+    Run a tournament described by the command line arguments args.
+    """
+    parser = argparse.ArgumentParser(
+        description='Play games between two strategies without input.')
+    parser.add_argument('game', choices=sorted(playable_games))
+    parser.add_argument('first', choices=sorted(tournament_strategies))
+    parser.add_argument('second', choices=sorted(tournament_strategies))
+    parser.add_argument('-n', '--matches', type=int, default=10)
+    parser.add_argument('--length', type=int, default=2,
+                        help='side length of a Stonehenge board')
+    parser.add_argument('--total', type=int, default=20,
+                        help='starting total of Subtract Square')
+    parser.add_argument('--p2-starts', action='store_true',
+                        help='let Player 2 make the first move')
+    parser.add_argument('--fixed-seats', action='store_true',
+                        help='keep the first strategy as Player 1')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='number of processes to play games in')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the random module for the first game')
+    parser.add_argument('--json', action='store_true',
+                        help='print the summary as JSON')
+    parser.add_argument('--profile', metavar='FILE',
+                        help='append a line of JSON profiling every move '
+                             'to FILE')
+    options = parser.parse_args(args)
+    if options.profile and options.workers > 1:
+        parser.error('--profile only collects moves played in this process')
+
+    game_options = ({'length': options.length} if options.game == 'h'
+                    else {'total': options.total})
+    collecting = (strategy.SearchCollector(options.profile)
+                  if options.profile else contextlib.nullcontext())
+    with collecting:
+        results = run_tournament(options.game, options.first,
+                                 options.second, options.matches,
+                                 not options.fixed_seats,
+                                 not options.p2_starts, options.workers,
+                                 options.seed, **game_options)
+    summary = summarise(results)
+    if options.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print(_format_summary(summary))
+
+
+if __name__ == '__main__':
+    main()